@@ -1,12 +1,20 @@
 """
 Module: A Router
 Desp: Adaptive Routing Strategy
-version: 0.0.2
+version: 0.0.8
 
 requirements: router.py
 
 Changelog:  0.0.1 - router
             0.0.2 - fixed the CCD checking
+            0.0.3 - half full status from PortFIFO
+            0.0.4 - skip_idle_cycles for active set scheduling
+            0.0.5 - busy and congested signals from per line tables instead
+                    of going through the routers recursively
+            0.0.6 - X-Y direction from the routing table by dest id
+            0.0.7 - reset, the congestion lines built again on first use
+            0.0.8 - congestion line status as bit masks, the signals read
+                    without rescanning the line
 """
 from router import BaseRouter
 
@@ -14,17 +22,26 @@ from router import BaseRouter
 class ARouter(BaseRouter):
     def __init__(self, id, coordinates, rx_address):
         super().__init__(id, coordinates, rx_address)
+        # congestion line and position in it, by direction
+        self.lines = [None, None, None, None, None]
+        self.line_index = [None, None, None, None, None]
+
+    def reset(self):
+        super().reset()
+        # the lines of the other routers are dropped by their own reset
+        self.lines[:] = [None, None, None, None, None]
+        self.line_index[:] = [None, None, None, None, None]
 
     ### buffer status ###
 
     def buffer_half_full(self, port):
-        half_full = int(self.buffer_size / 2)
+        buffer = self.buffer[port]
         # Case when pkt sent, the actual buffer size becomes (Threshold_v-1)
-        if (len(self.buffer[port]) == half_full - 1) and self.pkt_sent[port]:
+        if (len(buffer) == buffer.half_size - 1) and self.pkt_sent[port]:
             return True
 
         # For cases when buffer_size is more than threshold, even before/after sent
-        elif len(self.buffer[port]) >= half_full:
+        elif buffer.half_full():
             return True
         else:
             return False
@@ -66,7 +83,7 @@ class ARouter(BaseRouter):
     def opposite_port_original(self, direction):
         """
         retrive the opposite port id, orignal port encoding.
-        Use to reflect the view of the incoming port in get_x_index
+        Use to reflect the view of the incoming port in the congestion lines
         """
         port = None
         if direction == 1:
@@ -79,70 +96,69 @@ class ARouter(BaseRouter):
             port = self.EAST
         return port
 
-    def get_busy_loop(self, direction):
-        """
-        Get whether this direction is busy or not, OR operation for CCD in that
-        direction
-        Recursive function
-        """
-        is_busy = False
+    ### congestion lines ###
 
-        if self.buffer_half_full(self.opposite_port_original(direction)):
-            is_busy = True
-            return is_busy  # can early terminate since OR operation
-        else:
-            # continue to next router
-            neighbour_router = self.neighbour_routers[direction]
-            if neighbour_router is not None:
-                return neighbour_router.get_busy_loop(direction)
-            else:  # the last module on the line
-                return is_busy
+    def get_line(self, direction):
+        """ line of routers in this direction, built on first use """
+        if self.lines[direction] is None:
+            CongestionLine.build(self, direction)
+        return self.lines[direction]
+
+    def update_line_status(self, port):
+        """ store the port status to the line facing it, after it may change """
+        if port != self.SELF:
+            # line of the routers sending to this port
+            direction = self.opposite_port_original(port)
+            self.get_line(direction).update(
+                direction,
+                self.line_index[direction],
+                self.buffer_half_full(port),
+                self.buffer_full(port),
+            )
 
     def get_busy_index(self, direction):
         """
         Get whether this direction is busy or not, OR operation for CCD in that
-        direction
-        Starting func that calls Recursive function, to skip the first router
-        """
-        neighbour_router = self.neighbour_routers[direction]
-        if neighbour_router is not None:
-            return neighbour_router.get_busy_loop(direction)
-        else:  # should not be sending to unconnected port
-            return True
-
-    def get_congested_loop(self, direction):
-        """
-        Get whether this direction is congested or not, AND operation for CCD in
-        that direction
-        Recursive function
+        direction, True if there is no router in that direction
         """
-        if self.buffer_full(self.opposite_port_original(direction)):
-            is_congested = True
-        else:
-            is_congested = False
-        neighbour_router = self.neighbour_routers[direction]
-        if neighbour_router is not None:
-            return is_congested & neighbour_router.get_congested_loop(direction)
-        else:  # the last module on the line
-            return is_congested
+        return self.get_line(direction).busy(direction, self.line_index[direction])
 
     def get_congested_index(self, direction):
         """
         Get whether this direction is congested or not, AND operation for CCD in
-        that direction
-        Starting func that calls Recursive function, to skip the first router
+        that direction, True if there is no router in that direction
         """
-        neighbour_router = self.neighbour_routers[direction]
-        if neighbour_router is not None:
-            return neighbour_router.get_congested_loop(direction)
-        else:  # should not be sending to unconnected port
-            return True
+        return self.get_line(direction).congested(
+            direction, self.line_index[direction]
+        )
+
+    ### buffer operations with the line status ###
+
+    def packet_in(self, packet, port):
+        status = super().packet_in(packet, port)
+        if status:
+            self.update_line_status(port)
+        return status
+
+    def buffer_packet_remove(self, port):
+        super().buffer_packet_remove(port)
+        self.update_line_status(port)
 
-    def arbiter(self, dest_coordinates):
+    def send_controller_post(self):
+        super().send_controller_post()
+        self.update_line_status(self.current_serving_port)  # pkt_sent set
+
+    def prepare_next_cycle(self):
+        sent_ports = [port for port in range(1, 5) if self.pkt_sent[port]]
+        super().prepare_next_cycle()
+        for port in sent_ports:  # pkt_sent reset
+            self.update_line_status(port)
+
+    def arbiter(self, dest_id):
         """
         Algo: Adaptive Routing
         """
-        direction = super().arbiter(dest_coordinates)
+        direction = super().arbiter(dest_id)
         direction_old = direction
         if direction != self.SELF:
             # change the old direction index to the direction in the paper
@@ -202,4 +218,87 @@ class ARouter(BaseRouter):
             # exit if all ports are empty
             serving_port = (serving_port + 1) % 5
         self.current_serving_port = serving_port
-        return self.current_serving_port
\ No newline at end of file
+        return self.current_serving_port
+
+    ### external functions for simulator performance ###
+
+    def skip_idle_cycles(self, cycles):
+        """ the scheduler stays on the same port when all buffers are empty """
+        pass
+
+
+class CongestionLine:
+    """
+    The busy (OR over half full) and congested (AND over full) signals for a
+    row or column of the mesh, in both directions along it.
+    The routers store the status of their ports facing along the line as bit
+    masks by position when it may have changed. A signal is 1 shift and mask
+    of the routers after the position, no scan of the line.
+    So the signals are the same as going through the routers one by one,
+    including the changes made earlier in the cycle.
+    """
+
+    def __init__(self, routers, forward, backward):
+        self.routers = routers  # in the order of the forward direction
+        self.forward = forward
+        self.backward = backward
+        self.last = len(routers) - 1
+        # status of the port facing back, indexed by the direction sent to,
+        # bit i for the router at position i
+        self.half_full = [0, 0, 0, 0, 0]
+        self.full = [0, 0, 0, 0, 0]
+
+    @classmethod
+    def build(cls, router, direction):
+        """ create the line going through the router in this direction """
+        if direction in (router.EAST, router.WEST):
+            forward, backward = router.EAST, router.WEST
+        else:
+            forward, backward = router.SOUTH, router.NORTH
+        first = router
+        while first.neighbour_routers[backward] is not None:
+            first = first.neighbour_routers[backward]
+        routers = []
+        while first is not None:
+            routers.append(first)
+            first = first.neighbour_routers[forward]
+
+        line = cls(routers, forward, backward)
+        for index, line_router in enumerate(routers):
+            for line_direction in (forward, backward):
+                line_router.lines[line_direction] = line
+                line_router.line_index[line_direction] = index
+        for line_router in routers:  # the current status, may be built mid run
+            for line_direction in (forward, backward):
+                line_router.update_line_status(
+                    line_router.opposite_port_original(line_direction)
+                )
+        return line
+
+    def update(self, direction, index, half_full, full):
+        """ store the port status of the router at index """
+        bit = 1 << index
+        if half_full:
+            self.half_full[direction] |= bit
+        else:
+            self.half_full[direction] &= ~bit
+        if full:
+            self.full[direction] |= bit
+        else:
+            self.full[direction] &= ~bit
+
+    def after(self, direction, mask, index):
+        """ bits of the routers after index going in this direction, and count """
+        if direction == self.forward:
+            return mask >> (index + 1), self.last - index
+        return mask & ((1 << index) - 1), index
+
+    def busy(self, direction, index):
+        """ any router after it half full, True with no router after """
+        bits, count = self.after(direction, self.half_full[direction], index)
+        return count == 0 or bits != 0
+
+    def congested(self, direction, index):
+        """ all the routers after it full, True with no router after """
+        bits, count = self.after(direction, self.full[direction], index)
+        return bits == (1 << count) - 1
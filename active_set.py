@@ -0,0 +1,129 @@
+"""
+Module: active_set
+Desp:   Active set scheduling, only the routers holding packets are run
+version: 0.0.4
+
+requirements: numpy, router.py
+
+Changelog:  0.0.1 - initial release
+            0.0.2 - traversal count of the routers for the heatmap
+            0.0.3 - reset of the routers and the schedule
+            0.0.4 - run_cycle split in its send and prepare phases
+"""
+import heapq
+import numpy as np
+
+
+class ActiveSet:
+    """
+    Runs the routers with packets in their buffers, in the order of their id
+    like a loop over the whole router list. A router joins the set when a
+    packet is stored into it and leaves once it has drained. The cycles
+    skipped while idle are caught up by the router when it wakes up.
+    """
+
+    def __init__(self, router_list):
+        self.router_list = router_list
+        self.active = set()  # id of the routers with packets
+        self.pkt_in_flight = 0  # injected but not stored at destination yet
+        self.current_clock_cycle = 0  # cycle for the packets injected now
+        self.current_router_id = -1  # router sending pkt, -1 outside run_cycle
+        self.serving_queue = []  # heap of router id still to run this cycle
+        self.late_routers = []  # woken up after their turn in this cycle
+        # packets entered from the neighbours, by router id
+        self.traversal_count = np.zeros(len(router_list), dtype=np.int64)
+        for router in router_list:
+            router.active_set = self
+            router.idle = True  # no router has been run yet
+            router.idle_since = 0
+
+    def reset(self):
+        """
+        Func: reset the routers and the schedule, as before the first cycle.
+        The heatmaps given out keep their counts
+        """
+        for router in self.router_list:
+            router.reset()
+            router.idle = True
+            router.idle_since = 0
+        self.active = set()
+        self.pkt_in_flight = 0
+        self.current_clock_cycle = 0
+        self.current_router_id = -1
+        self.serving_queue = []
+        self.late_routers = []
+        self.traversal_count = np.zeros(len(self.router_list), dtype=np.int64)
+
+    def packet_injected(self, router):
+        """ new packet stored to the local port of the router """
+        self.pkt_in_flight += 1
+        if router.idle:
+            self.wake_up(router)
+
+    def wake_up(self, router):
+        """
+        Func: add an idle router to the active set, called before the packet
+        is stored so the catch up sees the router as empty
+        """
+        current_clock_cycle = self.current_clock_cycle
+        router.skip_idle_cycles(current_clock_cycle - router.idle_since)
+        router.idle = False
+        self.active.add(router.id)
+        if self.current_router_id < 0:  # injection, run_cycle will queue it
+            pass
+        elif router.id > self.current_router_id:  # its turn not reached yet
+            heapq.heappush(self.serving_queue, router.id)
+        else:  # its turn has passed while it was empty
+            router.send_controller(current_clock_cycle)
+            self.late_routers.append(router)
+
+    def run_cycle(self, current_clock_cycle):
+        """ run the active routers for 1 cycle to send out pkt """
+        served_routers = self.send_phase(current_clock_cycle)
+        self.prepare_phase(served_routers, current_clock_cycle)
+
+    def send_phase(self, current_clock_cycle):
+        """ send_controller of the active routers, return the routers run """
+        self.current_clock_cycle = current_clock_cycle
+        self.serving_queue = sorted(self.active)  # sorted list is a heap
+        served_routers = []
+        while self.serving_queue:
+            router_id = heapq.heappop(self.serving_queue)
+            self.current_router_id = router_id
+            router = self.router_list[router_id]
+            # let router handles the background check
+            router.send_controller(current_clock_cycle)
+            served_routers.append(router)
+        self.current_router_id = -1
+        served_routers += self.late_routers
+        self.late_routers = []
+        return served_routers
+
+    def prepare_phase(self, served_routers, current_clock_cycle):
+        """
+        Func: set the next output pkt of the routers run, the drained ones
+        leave the set.
+
+        Why only set the next output pkt after all routers sent their pkt?
+        Ans: In hardware, it is not possible to write in and pop out the same
+        pkt in 1 cycle. To prevent the software thinking that the new pkt is
+        available immediately for sending, we set the flag to prevent new pkt
+        being read.
+
+        E.g. When the FIFO is full, if a pkt was sent in that cycle, software
+        wise it is not full anymore, but hardware wise it is will display as
+        full, impossible to write into that FIFO in that clock cycle. It will
+        only available in the next cycle.
+        """
+        # loop 2nd time to set the next output packet in the router's buffers
+        for router in served_routers:
+            router.prepare_next_cycle()
+            if router.empty_buffers():  # drained, skipped until next packet
+                self.active.discard(router.id)
+                router.idle = True
+                router.idle_since = current_clock_cycle + 1
+        self.current_clock_cycle = current_clock_cycle + 1
+
+    def heatmap(self, m, n):
+        """ traversal count as a m x n view, can be called at any time """
+        return self.traversal_count.reshape(m, n)
@@ -0,0 +1,306 @@
+"""
+Module: benchmark
+Desp:   simulator speed per router type, compared with a stored baseline
+version: 0.0.4
+
+requirements:   simulator.py, options.py
+
+Changelog:  0.0.1 - initial release
+            0.0.2 - no console interval in the workloads
+            0.0.3 - longer workloads run for a minimum cpu time, 5 repeats
+                    by default. Slower flagged above the spread of the
+                    repeats, peak memory of the first run of a workload
+            0.0.4 - defaults from options.py
+
+usage:  python3 benchmark.py --suite quick --save_baseline
+        python3 benchmark.py --suite quick
+        fixed seeded workloads of the 3 tests for every router type, each in
+        a fresh process. The speed and peak memory are compared with the
+        baseline json, a slower or bigger workload is flagged as a regression.
+        A workload is slower when its best time is over the baseline by more
+        than the spreads of the repeats of both, plus the tolerance
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import numpy as np
+
+import simulator
+
+from options import get_parser
+from options import str2bool
+
+try:  # not on windows
+    import resource
+except ImportError:
+    resource = None
+
+TEST_NAMES = {0: "single", 1: "random", 2: "constant"}
+ALGO_NAMES = {0: "XY", 1: "modXY", 2: "A", 3: "ELRA", 4: "CA"}
+
+# mesh sizes (square) and random pkt test rates of the suites
+SUITES = {
+    "quick": {"sizes": [4, 8, 16], "rates": [2, 8]},
+    "full": {"sizes": [4, 8, 16, 32, 64], "rates": [1, 4, 8]},
+}
+LOAD_CYCLES = 100
+CYCLE_LIMIT = 2000
+SEED = 0
+MIN_TIME = 0.5  # cpu seconds, a short workload is run again up to this time
+
+
+def suite_workloads(suite):
+    """ every test, router type, mesh size and rate of the suite """
+    workloads = []
+    for size in SUITES[suite]["sizes"]:
+        for test_mode in (0, 1, 2):
+            rates = SUITES[suite]["rates"] if test_mode == 1 else [None]
+            for target_rate in rates:
+                for algo_type in ALGO_NAMES:
+                    workloads.append(
+                        {
+                            "test_mode": test_mode,
+                            "m": size,
+                            "n": size,
+                            "algo_type": algo_type,
+                            "target_rate": target_rate,
+                        }
+                    )
+    return workloads
+
+
+def workload_name(workload):
+    name = "%s_%dx%d_%s" % (
+        TEST_NAMES[workload["test_mode"]],
+        workload["m"],
+        workload["n"],
+        ALGO_NAMES[workload["algo_type"]],
+    )
+    if workload["target_rate"] is not None:
+        name += "_rate%g" % workload["target_rate"]
+    return name
+
+
+def peak_memory_mb():
+    """ peak resident memory of this process, None if not available """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":  # bytes, kilobytes on linux
+        return peak / 2 ** 20
+    return peak / 2 ** 10
+
+
+def run_workload(workload):
+    """
+    Func: simulate the workload with simulator.main, in a fresh worker
+    process for the peak memory. It is run again until MIN_TIME of cpu time
+    has passed, the time taken is the average of these, the peak memory the
+    one of the first. The cycles and packets are read back from the sim_data
+    text, which all the tests write
+    """
+    args = get_parser().parse_args([])  # defaults of the simulator
+    for field, value in workload.items():
+        if value is not None:
+            setattr(args, field, value)
+    args.load_cycles = LOAD_CYCLES
+    args.cycle_limit = CYCLE_LIMIT
+    args.seed = SEED
+    args.verbose = 0
+    args.print_output = False
+    args.console_interval = 0  # nothing printed, no wait at the end
+    args.sim_summary_path = os.devnull
+    fd, args.sim_data_path = tempfile.mkstemp(suffix=".txt")
+    os.close(fd)
+
+    iterations = 0
+    time_spent = 0
+    memory_mb = None
+    try:
+        while time_spent < MIN_TIME:
+            np.random.seed(SEED)  # the other tests use the global random states
+            random.seed(SEED)
+            start_time = time.process_time()
+            with contextlib.redirect_stdout(io.StringIO()):
+                simulator.main(args)
+            time_spent += time.process_time() - start_time
+            iterations += 1
+            if memory_mb is None:  # the next runs can only add to it
+                memory_mb = peak_memory_mb()
+        with open(args.sim_data_path) as f:
+            sim_data = f.read()
+    finally:
+        os.remove(args.sim_data_path)
+    time_taken = time_spent / iterations
+
+    cycles = CYCLE_LIMIT  # unless it ended before the limit
+    packets = 0
+    for line in sim_data.splitlines():
+        if line.startswith("ending cycle = "):
+            cycles = int(line.split("=")[1]) + 1
+        elif line.startswith("Total number of pkt reached their destination = "):
+            packets = int(line.split("=")[1])
+    return {
+        "cycles": cycles,
+        "packets": packets,
+        "iterations": iterations,
+        "time_taken": time_taken,
+        "cycles_per_second": cycles / time_taken,
+        "packets_per_second": packets / time_taken,
+        "peak_memory_mb": memory_mb,
+    }
+
+
+def run_suite(workloads, repeat):
+    """
+    the fastest of the repeats, every run in its own process. The spread is
+    how much slower the slowest repeat is than the fastest, as a fraction
+    """
+    results = {}
+    with multiprocessing.Pool(processes=1, maxtasksperchild=1) as pool:
+        for workload in workloads:
+            name = workload_name(workload)
+            runs = [pool.apply(run_workload, (workload,)) for r in range(repeat)]
+            result = min(runs, key=lambda run: run["time_taken"])
+            slowest = max(run["time_taken"] for run in runs)
+            result["spread"] = slowest / result["time_taken"] - 1
+            results[name] = result
+            print(
+                "%-32s %6d cycles %9.0f cycles/s %9.0f pkt/s +-%4.1f%% %s"
+                % (
+                    name,
+                    result["cycles"],
+                    result["cycles_per_second"],
+                    result["packets_per_second"],
+                    100 * result["spread"],
+                    format_memory(result["peak_memory_mb"]),
+                )
+            )
+    return results
+
+
+def format_memory(memory_mb):
+    return "-" if memory_mb is None else "%7.1f MB" % memory_mb
+
+
+def compare(results, baseline, tolerance):
+    """
+    Func: print the changes from the baseline, return the names of the
+    regressions. Slower is over the spreads of the 2 results plus the
+    tolerance. Different cycles or packets mean the simulation itself
+    changed, they are flagged too
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        speed = result["cycles_per_second"] / base["cycles_per_second"]
+        spread = result["spread"] + base.get("spread", 0)
+        flags = []
+        if 1 / speed > 1 + spread + tolerance:
+            flags.append("SLOWER")
+        if (
+            result["peak_memory_mb"] is not None
+            and base["peak_memory_mb"] is not None
+            and result["peak_memory_mb"] > base["peak_memory_mb"] * (1 + tolerance)
+        ):
+            flags.append("MORE MEMORY")
+        if (result["cycles"], result["packets"]) != (base["cycles"], base["packets"]):
+            flags.append("DIFFERENT RESULT")
+        if flags:
+            regressions.append(name)
+        print(
+            "%-32s speed x%.2f +-%4.1f%% %s"
+            % (name, speed, 100 * spread, " ".join(flags))
+        )
+    return regressions
+
+
+def main(args):
+    workloads = suite_workloads(args.suite)
+    if args.filter is not None:
+        workloads = [
+            workload for workload in workloads if args.filter in workload_name(workload)
+        ]
+    print("%d workloads" % len(workloads))
+    results = run_suite(workloads, args.repeat)
+
+    if args.save_baseline:
+        baseline = {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "workloads": results,
+        }
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=1)
+        print("baseline saved to %s" % args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("no baseline at %s, use --save_baseline to create it" % args.baseline)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    print("-------- compared with %s --------" % args.baseline)
+    regressions = compare(results, baseline["workloads"], args.tolerance)
+    if regressions:
+        print("%d regressions" % len(regressions))
+        return 1
+    print("no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="noc simulator benchmark",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument(
+        "--suite",
+        type=str,
+        default="quick",
+        choices=sorted(SUITES),
+        help="quick: 4x4 to 16x16, full: 4x4 to 64x64",
+    )
+    parser.add_argument(
+        "--filter",
+        type=str,
+        default=None,
+        help="only the workloads with this in their name, e.g. random_8x8",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="runs per workload, the fastest is kept"
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default="./benchmark_baseline.json",
+        help="json of the baseline results",
+    )
+    parser.add_argument(
+        "--save_baseline",
+        type=str2bool,
+        nargs="?",
+        const=True,
+        default=False,
+        help="store the results as the baseline instead of comparing",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.05,
+        help="fraction slower, on top of the spread of the repeats, or bigger\n"
+        "than the baseline to flag",
+    )
+    args = parser.parse_args()
+
+    sys.exit(main(args))
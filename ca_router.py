@@ -1,103 +1,119 @@
 """
 Module: CA Router
 Desp: Congestion-Aware Routing Algorithm
-version: 0.0.2
+version: 0.1.4
 
 requirements: router.py
 
 Changelog:  0.0.1 - router
             0.0.2 - bug fix for arbiter
             0.1.0 - moved set_neighbour_routers to baseRouter
+            0.1.1 - half full status from PortFIFO
+            0.1.2 - full and half full counters kept as buffers change, busy
+                    index from a precomputed table
+            0.1.3 - X and Y candidates from the routing table by dest id
+            0.1.4 - reset of the buffer counters
 """
 from router import BaseRouter
 
 
+def busy_index_rule(c_full, full, half_full):
+    """
+    Func: the busy index from the channel full status and the number of full
+    and half full buffers of the router
+    """
+    busy_index = None
+    if not c_full and half_full <= 2:
+        busy_index = 0
+    if not c_full and half_full > 2:
+        busy_index = 1
+    if not c_full and full > 0 and full < 2:
+        busy_index = 2
+    if c_full and half_full < 3:
+        busy_index = 3
+    if c_full and half_full >= 3:
+        busy_index = 4
+    if not c_full and full > 2:
+        busy_index = 5
+    if c_full and full > 1:
+        busy_index = 6
+    if c_full and full > 2:
+        busy_index = 7
+    return busy_index
+
+
+# look up table, [c_full][full][half_full], 5 buffers per router
+BUSY_INDEX_TABLE = [
+    [
+        [busy_index_rule(c_full, full, half_full) for half_full in range(6)]
+        for full in range(6)
+    ]
+    for c_full in (False, True)
+]
+
+
 class CARouter(BaseRouter):
     def __init__(self, id, coordinates, rx_address):
         super().__init__(id, coordinates, rx_address)
+        # number of buffers full and half full, updated when they change
+        self.full_count = 0
+        self.half_full_count = 0
+
+    def reset(self):
+        super().reset()
+        self.full_count = 0
+        self.half_full_count = 0
 
     def get_busy_index(self, channel):
         """
         Func: calculate the busy index using look up table
         """
-        full = 0
-        half_full = 0
-        for buffer in self.buffer:
-            if len(buffer) == self.buffer_size:
-                full += 1
-            if len(buffer) >= (self.buffer_size / 2):
-                half_full += 1
-        c_full = True if len(self.buffer[channel]) == self.buffer_size else False
-        busy_index = None
-        # look up table
-        if not c_full and half_full <= 2:
-            busy_index = 0
-        if not c_full and half_full > 2:
-            busy_index = 1
-        if not c_full and full > 0 and full < 2:
-            busy_index = 2
-        if c_full and half_full < 3:
-            busy_index = 3
-        if c_full and half_full >= 3:
-            busy_index = 4
-        if not c_full and full > 2:
-            busy_index = 5
-        if c_full and full > 1:
-            busy_index = 6
-        if c_full and full > 2:
-            busy_index = 7
+        c_full = len(self.buffer[channel]) == self.buffer_size
+        return BUSY_INDEX_TABLE[c_full][self.full_count][self.half_full_count]
+
+    ### buffer operations with the counters ###
 
-        return busy_index
+    def packet_in(self, packet, port):
+        status = super().packet_in(packet, port)
+        if status:
+            buffer = self.buffer[port]
+            length = len(buffer)
+            # exact size, the unlimited local port is not full above it
+            if length == buffer.size:
+                self.full_count += 1
+            elif length == buffer.size + 1:
+                self.full_count -= 1
+            if length == buffer.half_size:
+                self.half_full_count += 1
+        return status
 
-    def arbiter(self, dest_coordinates):
+    def buffer_packet_remove(self, port):
+        super().buffer_packet_remove(port)
+        buffer = self.buffer[port]
+        length = len(buffer)
+        if length == buffer.size - 1:
+            self.full_count -= 1
+        elif length == buffer.size:
+            self.full_count += 1
+        if length == buffer.half_size - 1:
+            self.half_full_count -= 1
+
+    def arbiter(self, dest_id):
         """
         Algo: Congestion Aware router
         Details: Decide on whether to go X direction or Y direction based on
         which one is free
         """
-        direction = None
-        ex = dest_coordinates[1] - self.coordinates[1]
-        ey = dest_coordinates[0] - self.coordinates[0]
-
-        if ex > 0:
-            if ey > 0:
-                if self.neighbour_routers[self.SOUTH].get_busy_index(
-                    self.SOUTH
-                ) >= self.neighbour_routers[self.EAST].get_busy_index(self.EAST):
-                    direction = self.EAST
-                else:
-                    direction = self.SOUTH
-            elif ey < 0:
-                if self.neighbour_routers[self.NORTH].get_busy_index(
-                    self.NORTH
-                ) >= self.neighbour_routers[self.EAST].get_busy_index(self.EAST):
-                    direction = self.EAST
-                else:
-                    direction = self.NORTH
-            else:
-                direction = self.EAST
-        elif ex < 0:
-            if ey > 0:
-                if self.neighbour_routers[self.SOUTH].get_busy_index(
-                    self.SOUTH
-                ) >= self.neighbour_routers[self.WEST].get_busy_index(self.WEST):
-                    direction = self.WEST
-                else:
-                    direction = self.SOUTH
-            elif ey < 0:
-                if self.neighbour_routers[self.NORTH].get_busy_index(
-                    self.NORTH
-                ) >= self.neighbour_routers[self.WEST].get_busy_index(self.WEST):
-                    direction = self.WEST
-                else:
-                    direction = self.NORTH
-            else:
-                direction = self.WEST
-        else:  # ex==0
-            if ey > 0:
-                direction = self.SOUTH
-            elif ey < 0:
-                direction = self.NORTH
-            else:  # reached destination
-                direction = self.SELF
+        route_row = self.route_row
+        direction = route_row[dest_id]  # X direction, Y if on the same column
+        if direction == self.EAST or direction == self.WEST:
+            # Y direction, to the router of this column on the dest row
+            y_direction = route_row[
+                dest_id - dest_id % self.routing_table.n + self.coordinates[1]
+            ]
+            if y_direction != self.SELF:  # both are minimal, take the free one
+                if self.neighbour_routers[y_direction].get_busy_index(
+                    y_direction
+                ) < self.neighbour_routers[direction].get_busy_index(direction):
+                    direction = y_direction
         return direction
@@ -0,0 +1,177 @@
+"""
+Module: checkpoint
+Desp:   save and load the simulation state at a cycle boundary
+version: 0.0.3
+
+requirements: router.py, packet.py
+
+Changelog:  0.0.1 - initial release
+            0.0.2 - RecordFile, records appended to a file, saved as its size
+            0.0.3 - the compact packets saved as columns after the state,
+                    not as 1 object each
+"""
+import os
+import pickle
+import random
+from array import array
+import numpy as np
+
+from packet import CompactPacket
+from router import BaseRouter
+
+
+class StatePickler(pickle.Pickler):
+    """
+    The routers link to each other, pickling them through the links goes as
+    deep as the mesh. They are saved as ids and their states kept flat.
+    The compact packets are saved as their index in the packet columns,
+    dumped after the state with packet_columns
+    """
+
+    def __init__(self, file, protocol=None):
+        super().__init__(file, protocol)
+        self.packet_index = {}  # by id() of the packets seen
+        self.packet_list = []
+
+    def persistent_id(self, obj):
+        if isinstance(obj, BaseRouter):
+            return type(obj), obj.id
+        if type(obj) is CompactPacket:
+            index = self.packet_index.get(id(obj))
+            if index is None:
+                index = self.packet_index[id(obj)] = len(self.packet_list)
+                self.packet_list.append(obj)
+            return index
+        return None
+
+    def packet_columns(self):
+        """
+        fields of the packets seen, in arrays like the PacketStore. The stores
+        are pickled once, the packets keep the index of their store
+        """
+        stores = []
+        store_index = {}  # by id() of the stores
+        columns = {
+            "store": array("i"),
+            "source_id": array("i"),
+            "dest_id": array("i"),
+            "start_clock_cycle": array("i"),
+            "clock_cycle_taken": array("i"),
+            "trace_offset": array("q"),
+        }
+        for packet in self.packet_list:
+            index = store_index.get(id(packet.store))
+            if index is None:
+                index = store_index[id(packet.store)] = len(stores)
+                stores.append(packet.store)
+            columns["store"].append(index)
+            columns["source_id"].append(packet.source_id)
+            columns["dest_id"].append(packet.dest_id)
+            columns["start_clock_cycle"].append(packet.start_clock_cycle)
+            columns["clock_cycle_taken"].append(packet.clock_cycle_taken)
+            columns["trace_offset"].append(packet.trace_offset)
+        return stores, columns
+
+
+class StateUnpickler(pickle.Unpickler):
+    def __init__(self, file):
+        super().__init__(file)
+        self.routers = {}  # by id, created empty, the states set after loading
+        self.packets = {}  # by index, created empty, filled from the columns
+
+    def persistent_load(self, pid):
+        if isinstance(pid, int):  # packet index
+            if pid not in self.packets:
+                self.packets[pid] = CompactPacket.__new__(CompactPacket)
+            return self.packets[pid]
+        router_type, router_id = pid
+        if router_id not in self.routers:
+            self.routers[router_id] = router_type.__new__(router_type)
+        return self.routers[router_id]
+
+    def load_packets(self, stores, columns):
+        """ the fields of the packets from the columns """
+        for index, packet in self.packets.items():
+            packet.store = stores[columns["store"][index]]
+            packet.source_id = columns["source_id"][index]
+            packet.dest_id = columns["dest_id"][index]
+            packet.start_clock_cycle = columns["start_clock_cycle"][index]
+            packet.clock_cycle_taken = columns["clock_cycle_taken"][index]
+            packet.trace_offset = columns["trace_offset"][index]
+
+
+def save_checkpoint(path, state, router_list):
+    """
+    Func: save the state dict and the routers, with the global random states
+    used by the generators. Written to a temporary file first, so an
+    interrupted save keeps the last checkpoint. The ports of the vectorized
+    engine are not routers, they are pickled as they are. The packets are
+    dumped after, same pickler so the stores are shared with the state.
+    A checkpoint holds every packet in flight, about 35 bytes each, and the
+    workload of the generator, so a loaded network takes some time to save
+    """
+    checkpoint = {
+        "state": state,
+        "routers": {
+            router.id: router.__getstate__()
+            for router in router_list
+            if isinstance(router, BaseRouter)
+        },
+        "numpy_random": np.random.get_state(),
+        "random": random.getstate(),
+    }
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        pickler = StatePickler(f, pickle.HIGHEST_PROTOCOL)
+        pickler.dump(checkpoint)
+        pickler.dump(pickler.packet_columns())
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path):
+    """ Func: return the saved state dict, the global random states restored """
+    with open(path, "rb") as f:
+        unpickler = StateUnpickler(f)
+        checkpoint = unpickler.load()
+        unpickler.load_packets(*unpickler.load())
+    for router_id, router_state in checkpoint["routers"].items():
+        unpickler.routers[router_id].__setstate__(router_state)
+    np.random.set_state(checkpoint["numpy_random"])
+    random.setstate(checkpoint["random"])
+    return checkpoint["state"]
+
+
+class RecordFile:
+    """
+    Records appended to a file as pickles, a checkpoint saves the size of
+    the file instead of the records. Opened at a saved size, the records
+    after it are dropped.
+    """
+
+    def __init__(self, path, size=None):
+        if size is None:
+            self.file = open(path, "w+b")
+        else:
+            self.file = open(path, "r+b")
+            self.file.truncate(size)
+            self.file.seek(size)
+
+    def records(self):
+        """ all the records in the file """
+        self.file.seek(0)
+        records = []
+        while True:
+            try:
+                records.append(pickle.load(self.file))
+            except EOFError:
+                return records
+
+    def append(self, record):
+        pickle.dump(record, self.file, pickle.HIGHEST_PROTOCOL)
+
+    def size(self):
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
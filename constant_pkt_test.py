@@ -1,27 +1,44 @@
 """
 Module: constant_pkt_test
 Desp:   constant pkt test for NoC congestion
-version: 0.0.1
+version: 0.1.4
 
 requirements:   sub_simulator_func.py
                 packet_generator.py
                 heatmap.py
 
 Changelog:  0.0.1 - initial release
+            0.0.2 - option to run basic XY on the vectorized engine
+            0.0.3 - only run the routers with packets, use pkt count to end
+            0.0.4 - heatmap from the traversal count of the network
+            0.0.5 - compiled mesh topology instead of networkx graph
+            0.0.6 - checkpoints every checkpoint_every cycles, resume from a
+                    checkpoint
+            0.0.7 - phase timing table with --profile
+            0.0.8 - binary packet trace with --trace_path
+            0.0.9 - sim data written by a background thread
+            0.1.0 - heatmap to a file with --heatmap_path, matplotlib imported
+                    only for the heatmap
+            0.1.1 - profiled injection and termination check picked before
+                    the cycle loop
+            0.1.2 - the checkpoints save the sim data offset, not its text
+            0.1.3 - injection and termination check inline when not profiling
+            0.1.4 - 1 injection function, only wrapped by the profiler
 """
 import argparse
+import copy
 import time
 import numpy as np
 
 import sub_simulator_func as sim_func
 
-from packet_generator import ConstGenerator
+from checkpoint import save_checkpoint
+from log_sink import open_log
 
-from heatmap import heatmap_display
-from heatmap import heatmap_multiple_display
+from packet_generator import ConstGenerator
 
 
-def sub_simulator(args, noc_map, noc_map_nodes):
+def sub_simulator(args, topology, resume=None):
     m, n = args.m, args.n
     algo_type = args.algo_type
     cycle_limit = args.cycle_limit
@@ -33,7 +50,14 @@ def sub_simulator(args, noc_map, noc_map_nodes):
     number_of_routers = m * n
     noc_heatmap_list = []
 
-    fout = open(sim_data_path, "w")
+    saved_args = copy.copy(args)  # for the checkpoints, before the algo edits
+    first_algo = 0
+    if resume is None:
+        fout = open_log(sim_data_path)
+    else:  # the text of the saved algos is in the file, up to the offset
+        fout = open_log(sim_data_path, resume["log_offset"])
+        noc_heatmap_list = resume["noc_heatmap_list"]
+        first_algo = resume["algo_index"]
 
     # set the algo types to run
     if algo_type == 5:  # loop all
@@ -42,52 +66,69 @@ def sub_simulator(args, noc_map, noc_map_nodes):
         algo_type_list = [algo_type]
 
     # run the simulation
-    for algo_type in algo_type_list:
+    for algo_index in range(first_algo, len(algo_type_list)):
+        algo_type = algo_type_list[algo_index]
         args.algo_type = algo_type  # edit the algo_type
-        out_str = "*************** For algo %d ***************\n" % algo_type
-        fout.write(out_str)
-        print(out_str, end="")
-
         start_time = time.time()
-
-        # init the packet generator
-        generator = ConstGenerator(m, n)
-
-        # create the routers and map them
-        router_list, receiver_list = sim_func.create_router_list(
-            args, noc_map, noc_map_nodes
-        )
+        if resume is None:
+            out_str = "*************** For algo %d ***************\n" % algo_type
+            fout.write(out_str)
+            print(out_str, end="")
+
+            # init the packet generator
+            generator = ConstGenerator(m, n, sim_func.record_traces(args))
+
+            # create the routers and map them
+            network, router_list, receiver_list = sim_func.create_network(
+                args, topology, sim_func.open_trace(args, 0, algo_type)
+            )
+            start_cycle = 0
+        else:  # continue from the saved cycle
+            generator = resume["generator"]
+            network = resume["network"]
+            router_list = resume["router_list"]
+            receiver_list = resume["receiver_list"]
+            start_cycle = resume["cycle"]
+            resume = None  # the next algos start from the first cycle
+        profiler = network.profiler if args.profile else None
+
+        def inject(current_clock_cycle):
+            """ the injection of the loop, timed when profiling """
+            for router in router_list:
+                # each router have possibility to initiate packet
+                pk = generator.get_packet(
+                    router.id, current_clock_cycle, router.buffer_empty_actual(0)
+                )
+                if pk is not None:  # no packet from this router
+                    router.packet_in(pk, 0)
+
+        def in_flight():
+            return network.pkt_in_flight
+
+        timed_in_flight = None
+        if profiler is not None:  # only bound when profiling
+            inject = profiler.timed("injection", type(generator).__name__, inject)
+            timed_in_flight = profiler.timed("termination check", "network", in_flight)
 
         # number of cycles to simulate for single packet testing
-        for current_clock_cycle in range(cycle_limit):
+        for current_clock_cycle in range(start_cycle, cycle_limit):
 
             empty_flag = True
 
             """ set up the testing packets in load_cycles """
             if current_clock_cycle < load_cycles:
-                for router in router_list:
-                    # each router have possibility to initiate packet
-                    pk = generator.get_packet(
-                        router.id, current_clock_cycle, router.buffer_empty_actual(0)
-                    )
-                    if pk is not None:  # no packet from this router
-                        router.packet_in(pk, 0)
-
+                inject(current_clock_cycle)
                 empty_flag = False  # prevent early termination
 
             """ This is to run the routers for 1 cycle to send out pkt """
-            for router_id in range(number_of_routers):
-                # check if the router is empty for early cycle termination
-                is_empty = router_list[router_id].empty_buffers()
-                if not is_empty:
-                    empty_flag = False
-
-                # let router handles the background check
-                router_list[router_id].send_controller(current_clock_cycle)
-
-            # loop 2nd time to set the next output packet in the router's buffers
-            for router_id in range(number_of_routers):
-                router_list[router_id].prepare_next_cycle()
+            # check if any packet left for early cycle termination
+            if timed_in_flight is None:
+                pkt_in_flight = network.pkt_in_flight
+            else:
+                pkt_in_flight = timed_in_flight()
+            if pkt_in_flight > 0:
+                empty_flag = False
+            network.run_cycle(current_clock_cycle)
 
             # if current_clock_cycle % 100 == 0:  # for debugging
             #     print("current_clock_cycle = ", current_clock_cycle)
@@ -98,17 +139,36 @@ def sub_simulator(args, noc_map, noc_map_nodes):
                 print(str1, end="")
                 break
 
+            if sim_func.checkpoint_due(args, current_clock_cycle):
+                state = {
+                    "args": saved_args,
+                    "algo_index": algo_index,
+                    "cycle": current_clock_cycle + 1,
+                    "generator": generator,
+                    "network": network,
+                    "router_list": router_list,
+                    "receiver_list": receiver_list,
+                    "noc_heatmap_list": noc_heatmap_list,
+                    "log_offset": fout.offset(),
+                }
+                save_checkpoint(args.checkpoint_path, state, router_list)
+
         print("--- time taken: %s seconds ---" % (time.time() - start_time))  # time
         print("--- Total packets sent: %s ---" % (generator.get_packet_sent_sum()))
         # collect the statistics
-        noc_heatmap = sim_func.stats_collection(receiver_list, fout, args)
+        stats_collection = sim_func.stats_collection
+        if profiler is not None:
+            stats_collection = profiler.timed(
+                "stats collection", "receivers", stats_collection
+            )
+        noc_heatmap = stats_collection(network, receiver_list, fout, args)
+        if profiler is not None:
+            print(profiler.table(), end="")
+        sim_func.close_trace(receiver_list)
         noc_heatmap_list.append(noc_heatmap)
 
     # final output for heatmap
     if verbose == 3:
-        if len(noc_heatmap_list) == 1:
-            heatmap_display(noc_heatmap_list[0], algo_type)
-        else:
-            heatmap_multiple_display(noc_heatmap_list)
+        sim_func.heatmap_output(noc_heatmap_list, algo_type, args.heatmap_path)
 
     fout.close()
\ No newline at end of file
@@ -5,6 +5,12 @@ Desp: router based on Low-Cost Routing Architecture (NPL, 2018)
 requirements: router.py
 
 Changelog:  0.0.1 - router
+            0.0.2 - threshold status from PortFIFO
+            0.0.3 - skip_idle_cycles for active set scheduling
+            0.0.4 - port status in preallocated lists per field, weights only
+                    updated for the ports changed
+            0.0.5 - setup from the compiled topology
+            0.0.6 - reset of the port status and serving group
 """
 from router import BaseRouter
 
@@ -14,22 +20,31 @@ class ELRARouter(BaseRouter):
         super().__init__(id, coordinates, rx_address)
         self.num_of_neighbour_routers = 0
         self.port_groups = []
-        self.port_status = [[], [], [], [], []]
+        # port status, 1 list per field indexed by port
+        self.w_sum = [0, 0, 0, 0, 0]
+        self.w_present = [0, 0, 0, 0, 0]
+        self.w_busy = [0, 0, 0, 0, 0]
+        self.w_congested = [0, 0, 0, 0, 0]
+        self.w_granted = [0, 0, 0, 0, 0]
+        self.w_waiting = [0, 0, 0, 0, 0]
+        self.port_changed = [True, True, True, True, True]  # to update weight
         self.Threshold_v = int(self.buffer_size / 2)
         self.current_serving_group = 1
 
     ### setup router ###
 
-    def setup_router(self, neighbour_routers):
+    def setup_router(self, topology, router_list):
         """ overloading this function to setup the router """
-        self.set_neighbour_routers(neighbour_routers)
+        self.set_neighbour_routers(topology, router_list)
         self.set_neighbours()
-        self.set_num_of_neighbour_routers(neighbour_routers)
+        self.set_num_of_neighbour_routers(self.neighbour_routers)
         self.set_group()
         self.set_port_status(0)  # speical set for loacl port
 
     def set_num_of_neighbour_routers(self, neighbour_routers):
-        self.num_of_neighbour_routers = len(neighbour_routers)
+        self.num_of_neighbour_routers = sum(
+            router is not None for router in neighbour_routers
+        )
 
     def set_group(self):
         """
@@ -51,20 +66,49 @@ class ELRARouter(BaseRouter):
 
     def set_port_status(self, port):
         """ inital the status """
-        self.port_status[port] = [0, 0, 0, 0, 0, 0]  # 0 w_sum and the rest
+        self.w_sum[port] = 0
+        self.w_present[port] = 0
+        self.w_busy[port] = 0
+        self.w_congested[port] = 0
+        self.w_granted[port] = 0
+        self.w_waiting[port] = 0
+        self.port_changed[port] = True
+
+    def reset(self):
+        super().reset()
+        for port in range(5):
+            self.set_port_status(port)
+        self.current_serving_group = 1
 
     ### buffer status ###
     def buffer_over_threshold_v(self, port):
+        buffer = self.buffer[port]
         # Case when pkt sent, the actual buffer size becomes (Threshold_v-1)
-        if (len(self.buffer[port]) == self.Threshold_v - 1) and self.pkt_sent[port]:
+        if (len(buffer) == self.Threshold_v - 1) and self.pkt_sent[port]:
             return True
 
         # For cases when buffer_size is more than threshold, even before/after sent
-        elif len(self.buffer[port]) >= self.Threshold_v:
+        elif buffer.half_full():  # half_size is the same as Threshold_v
             return True
         else:
             return False
 
+    ### buffer operations, mark the port status to update ###
+
+    def packet_in(self, packet, port):
+        status = super().packet_in(packet, port)
+        if status:
+            self.port_changed[port] = True
+        return status
+
+    def buffer_packet_remove(self, port):
+        super().buffer_packet_remove(port)
+        self.port_changed[port] = True
+
+    def send_controller_post(self):
+        super().send_controller_post()
+        self.port_changed[self.current_serving_port] = True  # pkt_sent set
+
     ### router functions ###
 
     def prepare_next_cycle(self):
@@ -72,7 +116,17 @@ class ELRARouter(BaseRouter):
         # update grant and wait status, special for ELRA router
         # as long the port is served, it need to update
         self.update_port_status_after_serving()
+        port_changed = self.port_changed
+        pkt_sent = self.pkt_sent
+        for port in range(5):
+            if pkt_sent[port]:  # to be reset
+                port_changed[port] = True
         super().prepare_next_cycle()
+        pkt_available = self.pkt_available_to_send_now
+        w_present = self.w_present
+        for port in range(5):
+            if pkt_available[port] != w_present[port]:  # changed since update
+                port_changed[port] = True
 
     def scheduler(self):
         """
@@ -88,35 +142,33 @@ class ELRARouter(BaseRouter):
         if self.current_serving_group == 0:  # local port
             self.current_serving_port = 0
         else:  # other ports
-            # check which port has the highest weights
-            max_w_sum = -1
-            temp_serving_port = 0
-            for port in self.port_groups[self.current_serving_group]:
-                curr_w_sum = self.port_status[port][0]  # always at position 0
-                if curr_w_sum > max_w_sum:
-                    # print(port,max_w_sum)
-                    max_w_sum = curr_w_sum
-                    temp_serving_port = port
+            # check which port has the highest weights, the first one if tie
+            w_sum = self.w_sum
+            temp_serving_port = max(
+                self.port_groups[self.current_serving_group],
+                key=w_sum.__getitem__,
+                default=0,
+            )
+            if w_sum[temp_serving_port] < 0:  # only weights above -1 are served
+                temp_serving_port = 0
             self.current_serving_port = temp_serving_port
         return self.current_serving_port
 
     ### special ELRA functions ###
 
     def update_group_port_status(self, current_serving_group):
+        port_changed = self.port_changed
         for port in self.port_groups[current_serving_group]:
-            self.update_port_status_weight(port)
+            if port_changed[port]:  # else same buffer status as last update
+                self.update_port_status_weight(port)
 
     def update_port_status_weight(self, port):
         """ do this before the start of the cycle """
-        status = self.port_status[port]
-        w_p = int(bool(not self.buffer_empty(port)))  # status_present
-        w_b = int(bool(self.buffer_over_threshold_v(port)))  # status_busy
-        w_c = int(bool(self.buffer_full(port)))  # status_congested
-        w_g = status[4]  # not updated here
-        w_w = status[5]  # not updated here
-
-        w_sum = self.weight_sum(w_p, w_b, w_c, w_g, w_w)
-        self.port_status[port] = [w_sum, w_p, w_b, w_c, w_g, w_w]  # fixed order
+        self.w_present[port] = int(not self.buffer_empty(port))  # status_present
+        self.w_busy[port] = int(self.buffer_over_threshold_v(port))  # status_busy
+        self.w_congested[port] = int(self.buffer_full(port))  # status_congested
+        self.port_changed[port] = False
+        self.update_weight_sum(port)  # grant and wait not updated here
 
     def update_port_status_after_serving(self):
         """ do this after current serving port is confirmed """
@@ -127,18 +179,43 @@ class ELRARouter(BaseRouter):
                 self.update_status_for_waiting(port)
 
     def update_status_for_granted(self, port):
-        self.port_status[port][4] = 1
-        self.port_status[port][5] = 0
+        self.set_grant_wait_status(port, 1, 0)
 
     def update_status_for_waiting(self, port):
         # check if buffer empty, then it is not waiting
         if self.buffer_empty(port):
-            self.port_status[port][4] = 0
-            self.port_status[port][5] = 0
+            self.set_grant_wait_status(port, 0, 0)
         else:
-            self.port_status[port][4] = 0
-            self.port_status[port][5] = 1
+            self.set_grant_wait_status(port, 0, 1)
+
+    def set_grant_wait_status(self, port, w_g, w_w):
+        if self.w_granted[port] != w_g or self.w_waiting[port] != w_w:
+            self.w_granted[port] = w_g
+            self.w_waiting[port] = w_w
+            self.update_weight_sum(port)
+
+    def update_weight_sum(self, port):
+        self.w_sum[port] = self.weight_sum(
+            self.w_present[port],
+            self.w_busy[port],
+            self.w_congested[port],
+            self.w_granted[port],
+            self.w_waiting[port],
+        )
 
     def weight_sum(self, w_p, w_b, w_c, w_g, w_w):
         """ calculate the total traffic status weight """
         return w_p * 3 + w_b * 1 + w_c * 2 + w_g * (-1) + w_w * 1
+
+    ### external functions for simulator performance ###
+
+    def skip_idle_cycles(self, cycles):
+        """
+        The groups take turns every cycle, and the grant and wait status is
+        cleared after each group is served twice. After 4 idle cycles the
+        states repeat every 2 cycles.
+        """
+        if cycles > 4:
+            cycles = 4 + cycles % 2
+        for cycle in range(cycles):
+            self.idle_cycle()
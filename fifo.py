@@ -0,0 +1,40 @@
+"""
+Module: fifo
+Desp:   FIFO used for the router port buffers
+version: 0.0.1
+
+requirements: NIL
+
+Changelog:  0.0.1 - initial release
+"""
+from collections import deque
+
+
+class PortFIFO(deque):
+    """
+    O(1) append, popleft and peek, with cached status thresholds.
+    size is the hardware buffer size used by the status queries. The FIFO
+    itself never refuses a packet, the router checks buffer_full before
+    storing. The local port is not checked, so it grows as needed.
+    """
+
+    __slots__ = ("size", "half_size")
+
+    def __init__(self, size):
+        super().__init__()
+        self.size = size
+        self.half_size = int(size / 2)
+
+    def __reduce__(self):
+        """ for copy and pickle, deque's own version passes the wrong args """
+        return self.__class__, (self.size,), None, iter(self)
+
+    def peek(self):
+        """ first packet, None if empty """
+        return self[0] if self else None
+
+    def full(self):
+        return len(self) >= self.size
+
+    def half_full(self):
+        return len(self) >= self.half_size
@@ -1,14 +1,16 @@
 """
 with reference to
 https://matplotlib.org/3.1.1/gallery/images_contours_and_fields/image_annotated_heatmap.html?highlight=heatmap
+
+matplotlib is imported by the functions, not when the simulator starts
 """
 
+import multiprocessing
 import numpy as np
-import matplotlib
-import matplotlib.pyplot as plt
 
 
-def heatmap_multiple_display(heatmap_list):
+def heatmap_multiple_display(heatmap_list, save_path=None):
+    import matplotlib.pyplot as plt
 
     fig = plt.figure()
     ax = [None, None, None, None, None]
@@ -39,10 +41,12 @@ def heatmap_multiple_display(heatmap_list):
         texts = annotate_heatmap(im, valfmt="{x:d}")
 
     fig.tight_layout()
-    plt.show()
+    show_or_save(fig, save_path)
+
 
+def heatmap_display(heatmap_arr, algo_type, save_path=None):
+    import matplotlib.pyplot as plt
 
-def heatmap_display(heatmap_arr, algo_type):
     m, n = heatmap_arr.shape
 
     labels = [
@@ -65,7 +69,42 @@ def heatmap_display(heatmap_arr, algo_type):
     texts = annotate_heatmap(im, valfmt="{x:d}")
 
     fig.tight_layout()
-    plt.show()
+    show_or_save(fig, save_path)
+
+
+def show_or_save(fig, save_path):
+    """ show the figure, or save it to the file, png or svg by its extension """
+    import matplotlib.pyplot as plt
+
+    if save_path is None:
+        plt.show()
+    else:
+        fig.savefig(save_path)
+        plt.close(fig)
+
+
+def heatmap_render(heatmap_list, algo_type, save_path):
+    """ heatmap of 1 algo or all of them into the file, with the Agg backend """
+    import matplotlib
+
+    matplotlib.use("Agg")  # no window
+    if len(heatmap_list) == 1:
+        heatmap_display(heatmap_list[0], algo_type, save_path)
+    else:
+        heatmap_multiple_display(heatmap_list, save_path)
+
+
+def heatmap_render_process(heatmap_list, algo_type, save_path):
+    """
+    Func: render the heatmaps in a worker process, the simulation goes on
+    without waiting. The process is joined when the simulator exits. It is
+    spawned, a fork could copy a lock held by the log writer threads
+    """
+    process = multiprocessing.get_context("spawn").Process(
+        target=heatmap_render, args=(heatmap_list, algo_type, save_path)
+    )
+    process.start()
+    return process
 
 
 def heatmap(data, row_labels, col_labels, ax=None, cbar_kw={}, cbarlabel="", **kwargs):
@@ -90,6 +129,7 @@ def heatmap(data, row_labels, col_labels, ax=None, cbar_kw={}, cbarlabel="", **k
     **kwargs
         All other arguments are forwarded to `imshow`.
     """
+    import matplotlib.pyplot as plt
 
     if not ax:
         ax = plt.gca()
@@ -158,6 +198,7 @@ def annotate_heatmap(
         All other arguments are forwarded to each call to `text` used to create
         the text labels.
     """
+    import matplotlib.ticker
 
     if not isinstance(data, (list, np.ndarray)):
         data = im.get_array()
@@ -0,0 +1,195 @@
+"""
+Module: log_sink
+Desp:   text output written by a background thread, for the sim data files
+        and the terminal
+version: 0.0.4
+
+requirements: NIL
+
+Changelog:  0.0.1 - initial release
+            0.0.2 - file offset for the checkpoints instead of the text read
+                    back, open_log continues a file from an offset
+            0.0.3 - writer threads not daemons, the text left written when
+                    the main thread ends without close. Console queue
+                    without limit, print does not wait for the terminal
+            0.0.4 - interval waited on an event, sync and close do not
+                    wait for it
+"""
+import contextlib
+import queue
+import sys
+import threading
+
+LOG_BUFFER_SIZE = 2 ** 20  # characters joined before they are queued
+LOG_QUEUE_SIZE = 16  # buffers waiting to be written, write waits above it
+CONSOLE_INTERVAL = 0.1  # seconds between the terminal writes
+WATCH_INTERVAL = 0.5  # seconds between the checks that the main thread runs
+
+
+class BackgroundWriter:
+    """
+    File like object, write only joins the text into a buffer. A full buffer
+    is queued for the writer thread, so the simulation only waits for the
+    file when the queue is full. With an interval the thread writes at most
+    once per interval, all that was queued in between at once. The thread
+    is not a daemon, if the main thread ends without close, e.g. by an
+    exception or sys.exit, it writes the text left and stops.
+    """
+
+    def __init__(
+        self,
+        file,
+        buffer_size=LOG_BUFFER_SIZE,
+        queue_size=LOG_QUEUE_SIZE,
+        interval=None,
+        close_file=True,
+    ):
+        self.file = file
+        self.buffer_size = buffer_size
+        self.interval = interval
+        self.close_file = close_file
+        self.buffer = []
+        self.buffer_length = 0
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None  # raised in the main thread on the next push
+        self.wake = threading.Event()  # ends the interval wait at once
+        self.closed = False
+        self.thread = threading.Thread(target=self.run)
+        self.thread.start()
+
+    def write(self, text):
+        self.buffer.append(text)
+        self.buffer_length += len(text)
+        if self.buffer_length >= self.buffer_size:
+            self.push()
+        return len(text)
+
+    def flush(self):
+        """ queue the buffer, does not wait for the write """
+        self.push()
+
+    def push(self):
+        if self.error is not None:
+            raise self.error
+        if self.buffer:
+            self.queue.put("".join(self.buffer))
+            self.buffer = []
+            self.buffer_length = 0
+
+    def sync(self):
+        """ wait until all the text so far is in the file """
+        self.push()
+        self.wake.set()
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    def offset(self):
+        """ size of the file with all the text so far, for the checkpoints """
+        self.sync()
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        """ write everything left and stop the thread """
+        if self.closed:
+            return
+        self.push()
+        self.queue.put(None)
+        self.wake.set()
+        self.thread.join()
+        self.closed = True
+        if self.close_file:
+            self.file.close()
+        else:
+            self.file.flush()
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        """ writer thread, None in the queue to stop """
+        while True:
+            try:
+                chunks = [self.queue.get(timeout=WATCH_INTERVAL)]
+            except queue.Empty:
+                if threading.main_thread().is_alive():
+                    continue
+                self.write_left()  # not closed, the interpreter is exiting
+                return
+            if self.interval is not None:  # take all that came in meanwhile
+                self.wake.wait(self.interval)  # or until sync or close
+                self.wake.clear()
+                while True:
+                    try:
+                        chunks.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+            stop = chunks[-1] is None
+            if stop:
+                chunks.pop()
+            try:
+                if self.error is None:
+                    self.file.write("".join(chunks))
+                    if self.interval is not None:  # terminal, show it now
+                        self.file.flush()
+            except Exception as error:  # for the main thread
+                self.error = error
+            for chunk in range(len(chunks) + stop):
+                self.queue.task_done()
+            if stop:
+                return
+
+    def write_left(self):
+        """ the queued and buffered text, once the main thread has ended """
+        chunks = []
+        while True:
+            try:
+                chunks.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        chunks = [chunk for chunk in chunks if chunk is not None]
+        chunks += self.buffer
+        if self.error is None and not self.file.closed:
+            self.file.write("".join(chunks))
+            self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_log(path, offset=None):
+    """
+    sim data or summary file written in the background. With an offset the
+    file is continued from there, the text after it is dropped
+    """
+    if offset is None:
+        return BackgroundWriter(open(path, "w"))
+    file = open(path, "r+")
+    file.seek(offset)
+    file.truncate()
+    return BackgroundWriter(file)
+
+
+@contextlib.contextmanager
+def console_sink(interval=CONSOLE_INTERVAL):
+    """
+    print goes through a background writer of the terminal, written at
+    most once per interval. Its queue has no limit, print never waits for
+    the terminal, the text printed in between is held until written.
+    Everything is written when the block ends
+    """
+    sink = BackgroundWriter(
+        sys.stdout,
+        buffer_size=0,  # queued at every print, the thread groups them
+        queue_size=0,  # no limit
+        interval=interval,
+        close_file=False,
+    )
+    try:
+        with contextlib.redirect_stdout(sink):
+            yield sink
+    finally:
+        sink.close()
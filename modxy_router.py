@@ -1,43 +1,69 @@
 """
 Module: modifiedXY Router
 Desp: Modified X–Y routing for mesh topology based NoC router
-version: 0.0.2
+version: 0.0.7
 
 requirements: router.py
 
 Changelog:  0.0.1 - router
             0.0.2 - updated external functions to check for side buffer also
+            0.0.3 - PortFIFO side buffers
+            0.0.4 - skip_idle_cycles for active set scheduling
+            0.0.5 - iSLIP scheduler on request bit masks and port orders
+            0.0.6 - setup from the compiled topology
+            0.0.7 - reset with the side buffers and port priorities
 """
+from fifo import PortFIFO
 from router import BaseRouter
 
 
 class modXYRouter(BaseRouter):
+    PORT_BIT = [1, 2, 4, 8, 16]  # bit of the port in the request masks
+
     def __init__(self, id, coordinates, rx_address):
         self.buffer_size = 1
         self.side_buffer_size = 3
-        self.side_buffer = [[], [], [], [], []]  # 5 buffers, 1 for each port
-        self.input_port_priority = [None, None, None, None, None]
-        self.output_port_priority = [None, None, None, None, None]
+        # 5 buffers, 1 for each port
+        self.side_buffer = [PortFIFO(self.side_buffer_size) for port in range(5)]
+        # connected ports from the highest priority to the lowest
+        self.input_port_order = []
+        self.output_port_order = []
+        # input ports requesting each output port, as bit masks
+        self.output_requests = [0, 0, 0, 0, 0]
+        # output port of the first packet of the input ports, by packet
+        self.head_packet = [None, None, None, None, None]
+        self.head_output_port = [0, 0, 0, 0, 0]
         self.pkt_waiting_in_side_buffer = [False, False, False, False, False]
         self.num_ports_connected = 0
         self.current_serving_output_port = 0
         super().__init__(id, coordinates, rx_address)
 
-    def setup_router(self, neighbour_routers):
+    def setup_router(self, topology, router_list):
         """ use/overload this function to setup the router """
-        self.set_neighbour_routers(neighbour_routers)
+        self.set_neighbour_routers(topology, router_list)
         self.set_neighbours()
         self.set_priority()
 
     def set_priority(self):
-        """ set the inital priority of the routers """
-        priority = 0
+        """ set the inital priority of the routers, in the port order """
         for port, router in enumerate(self.neighbours_id):
             if router is not None:
-                self.input_port_priority[port] = priority
-                self.output_port_priority[port] = priority
-                priority += 1
-        self.num_ports_connected = priority
+                self.input_port_order.append(port)
+                self.output_port_order.append(port)
+        self.num_ports_connected = len(self.input_port_order)
+
+    def reset(self):
+        super().reset()
+        for buffer in self.side_buffer:
+            buffer.clear()
+        del self.input_port_order[:]  # back to the inital priority
+        del self.output_port_order[:]
+        self.set_priority()
+        self.output_requests[:] = [0, 0, 0, 0, 0]
+        self.head_packet[:] = [None, None, None, None, None]
+        self.head_output_port[:] = [0, 0, 0, 0, 0]
+        self.pkt_waiting_in_side_buffer[:] = [False, False, False, False, False]
+        self.current_serving_output_port = 0
 
     ### buffer operations ###
 
@@ -62,7 +88,7 @@ class modXYRouter(BaseRouter):
         """ remove the side buffer data """
         if not self.side_buffer_empty(port):
             # remove the packet
-            self.side_buffer[port].pop(0)
+            self.side_buffer[port].popleft()
         else:
             raise BufferError("Trying to remove packet from empty buffer")
 
@@ -79,7 +105,7 @@ class modXYRouter(BaseRouter):
     def side_buffer_full(self, port):
         """ for current cycle, like hardware FIFO status """
         # no packet sent, but FIFO still full
-        if len(self.side_buffer[port]) >= self.side_buffer_size:
+        if self.side_buffer[port].full():
             return True
         # packet was sent, but hardware wise buffer still considered full
         elif (
@@ -104,7 +130,7 @@ class modXYRouter(BaseRouter):
         direction, packet = self.send_controller_pre(current_clock_cycle)
         if direction is not None:  # if there is packet
             status = self.neighbour_routers[direction].receive_check(
-                packet, self.id
+                packet, self.neighbour_input_port[direction]
             )  # try sending
             if status is True:
                 # remove from sending router
@@ -121,35 +147,17 @@ class modXYRouter(BaseRouter):
 
     def update_all_priority(self):
         """ for all the port priorities """
-        self.input_port_priority = self.update_priority(
-            self.input_port_priority, self.current_serving_port
-        )
-        self.output_port_priority = self.update_priority(
-            self.output_port_priority, self.current_serving_output_port
-        )
-
-    def update_priority(self, port_priority, current_serving_port):
+        self.update_priority(self.input_port_order, self.current_serving_port)
+        self.update_priority(self.output_port_order, self.current_serving_output_port)
+
+    def update_priority(self, port_order, current_serving_port):
         """
-        reduce the priority for the serving port
+        reduce the priority for the serving port, the ports after it move up
         update before next cycle starts
         """
-        max_priority = self.num_ports_connected - 1
-        serving_port_old_priority = port_priority[current_serving_port]
-
-        if serving_port_old_priority < max_priority:  # not the lowest
-            # increase the priority for other lower priority ports
-            for priority in range(serving_port_old_priority + 1, max_priority + 1):
-                try:
-                    port = port_priority.index(priority)
-                    port_priority[port] = priority - 1
-                except ValueError:
-                    pass
-        # else for port already have lowest priority, no change
-
-        # give the served port lowest priority
-        port_priority[current_serving_port] = max_priority
-
-        return port_priority
+        if port_order[-1] != current_serving_port:  # not the lowest already
+            port_order.remove(current_serving_port)
+            port_order.append(current_serving_port)
 
     def prepare_next_cycle_side(self):
         for port in range(len(self.side_buffer)):
@@ -180,66 +188,60 @@ class modXYRouter(BaseRouter):
         self.inject_pkt_from_side_buffer()
         super().prepare_next_cycle()
 
-    def send_pkt_queue(self):
-        """ check which port need to send pkt, return a list """
-        send_list = []
-        for port, status in enumerate(self.pkt_available_to_send_now):
-            if status:  # there is a pkt
-                send_list.append(port)
-        return send_list
-
-    def group_output_port(self, send_list):
-        """ group the input ports based on their direction/output """
-        output_port_dict = {}
-        # the input list should have more than 2 ports
-        for port in send_list:
-            packet = self.buffer_packet_peek(port)
-            output_port = self.arbiter(packet.dest_coordinates)
-            # retrive and update dict
-            try:
-                current_list = output_port_dict[output_port]
-                current_list.append(port)
-                output_port_dict.update({output_port: current_list})
-            except KeyError:
-                output_port_dict.update({output_port: [port]})
-
-        return output_port_dict
-
-    def check_highest_priority(self, port_list, priority_list):
+    def get_output_port(self, port):
+        """ output port of the first packet, the arbiter only for new packet """
+        packet = self.buffer_packet_peek(port)
+        if packet is not self.head_packet[port]:
+            self.head_packet[port] = packet
+            self.head_output_port[port] = self.arbiter(packet.dest_id)
+        return self.head_output_port[port]
+
+    def check_highest_priority(self, request_mask, port_order):
         """
         return the port with the highest priority
-        port_list is the filtered list of requesting ports
+        request_mask has the bits of the requesting ports
         """
-        highest_priority_port = 0
-        highest_priority = self.num_ports_connected
-        for port in port_list:
-            port_priority = priority_list[port]
-            if port_priority < highest_priority:
-                highest_priority = port_priority
-                highest_priority_port = port
-        return highest_priority_port
+        for port in port_order:
+            if request_mask & self.PORT_BIT[port]:
+                return port
+        return 0
 
     def scheduler(self):
         """
         Func: determine which port to serve based on priority
         algo: iSLIP scheduler
         """
-        send_list = self.send_pkt_queue()
-        if send_list:
-            if len(send_list) == 1:
-                self.current_serving_port = send_list[0]
+        request_mask = 0
+        for port in range(5):
+            if self.pkt_available_to_send_now[port]:  # there is a pkt
+                request_mask |= self.PORT_BIT[port]
+
+        if request_mask:
+            if not request_mask & (request_mask - 1):  # only 1 port
+                self.current_serving_port = request_mask.bit_length() - 1
                 return self.current_serving_port
             else:  # more than 1 port has pkt waiting
+                # group the input ports based on their direction/output
+                output_requests = self.output_requests
+                output_mask = 0
+                for port in range(5):
+                    if request_mask & self.PORT_BIT[port]:
+                        output_port = self.get_output_port(port)
+                        if output_mask & self.PORT_BIT[output_port]:
+                            output_requests[output_port] |= self.PORT_BIT[port]
+                        else:  # first request of this cycle
+                            output_requests[output_port] = self.PORT_BIT[port]
+                            output_mask |= self.PORT_BIT[output_port]
+
                 # check which output port has the highest priority
-                output_port_dict = self.group_output_port(send_list)
                 self.current_serving_output_port = self.check_highest_priority(
-                    output_port_dict, self.output_port_priority
+                    output_mask, self.output_port_order
                 )
 
                 # select which input port based on their priority
-                input_list = output_port_dict[self.current_serving_output_port]
                 self.current_serving_port = self.check_highest_priority(
-                    input_list, self.input_port_priority
+                    output_requests[self.current_serving_output_port],
+                    self.input_port_order,
                 )
                 return self.current_serving_port
 
@@ -248,6 +250,14 @@ class modXYRouter(BaseRouter):
 
     ### external functions for simulator performance ###
 
+    def skip_idle_cycles(self, cycles):
+        """
+        The serving ports stay the same when idle, only the first idle cycle
+        updates the priorities
+        """
+        if cycles > 0:
+            self.idle_cycle()
+
     def debug_empty_buffer(self):
         """ for debugging """
         super().debug_empty_buffer()
@@ -1,6 +1,7 @@
 """
-functions to link the coordinates x,y and id
+functions to link the coordinates x,y and id, and the compiled mesh topology
 """
+import numpy as np
 
 
 def coordinates_2_id(coordinates, m, n):
@@ -19,3 +20,51 @@ def coordinates_2_id_list(coordinates_list, m, n):
 def id_2_coordinates(id, m, n):
     """ m = rows, n = columns """
     return (int(id / n), int(id % n))
+
+
+class MeshTopology:
+    """
+    The 2d mesh compiled to arrays, built with numpy in O(m*n).
+    neighbours_id[router id, port] is the router connected to the port, -1 if
+    not connected, port 0 is the router itself.
+    reverse_port[router id, port] is the input port of the neighbour that the
+    packets sent out of the port go into.
+    """
+
+    SELF = 0  # same port encoding as BaseRouter
+    NORTH = 1
+    EAST = 2
+    SOUTH = 3
+    WEST = 4
+
+    def __init__(self, m, n):
+        self.m = m
+        self.n = n
+        self.number_of_routers = m * n
+        router_ids = np.arange(self.number_of_routers, dtype=np.int32)
+        self.router_ids = router_ids
+        self.rows = router_ids // n
+        self.cols = router_ids % n
+
+        self.neighbours_id = np.full((self.number_of_routers, 5), -1, dtype=np.int32)
+        self.neighbours_id[:, self.SELF] = router_ids
+        has_north = self.rows > 0
+        has_east = self.cols < n - 1
+        has_south = self.rows < m - 1
+        has_west = self.cols > 0
+        self.neighbours_id[has_north, self.NORTH] = router_ids[has_north] - n
+        self.neighbours_id[has_east, self.EAST] = router_ids[has_east] + 1
+        self.neighbours_id[has_south, self.SOUTH] = router_ids[has_south] + n
+        self.neighbours_id[has_west, self.WEST] = router_ids[has_west] - 1
+
+        # in a mesh the packet sent east comes in from the west and so on
+        mesh_reverse_port = np.array(
+            [self.SELF, self.SOUTH, self.WEST, self.NORTH, self.EAST], dtype=np.int8
+        )
+        self.reverse_port = np.broadcast_to(
+            mesh_reverse_port, (self.number_of_routers, 5)
+        )  # same row for all the routers, not copied
+
+    def coordinates(self, router_id):
+        """ (row, column) of the router """
+        return id_2_coordinates(router_id, self.m, self.n)
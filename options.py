@@ -0,0 +1,190 @@
+"""
+Module: options
+Desp:   command line options of the simulator and their defaults, without
+        the simulator imports so any module can read them
+version: 0.0.1
+
+requirements: NIL
+
+Changelog:  0.0.1 - initial release, get_parser and str2bool from simulator.py
+"""
+import argparse
+
+
+def str2bool(v):
+    if isinstance(v, bool):
+        return v
+    if v.lower() in ("yes", "true", "t", "y", "1"):
+        return True
+    elif v.lower() in ("no", "false", "f", "n", "0"):
+        return False
+    else:
+        return v
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description="noc simulator", formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--m", type=int, default="4", help="m, number of rows")
+    parser.add_argument("--n", type=int, default="4", help="n, number of columns")
+    parser.add_argument(
+        "--algo_type",
+        type=int,
+        default="0",
+        help="""type of routers to test.
+        0:basic XY,
+        1:modified XY,
+        2:Adaptive Routing,
+        3:ELRA,
+        4:CA router
+        5:all routers""",
+    )
+    parser.add_argument("--cycle_limit", type=int, default="1000", help="cycles limit")
+    parser.add_argument(
+        "--load_cycles",
+        type=int,
+        default="20",
+        help="cycles to inject packets in test mode 2",
+    )
+    parser.add_argument(
+        "--target_rate",
+        type=float,
+        default="5",
+        help="probability of sending spikes in test mode 1, low 0-10 high",
+    )
+    parser.add_argument(
+        "--test_mode",
+        type=int,
+        default="0",
+        help="0->single pkt test, 1->random pkt test, 2->congestion awareness test",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default="1",
+        help="number of runs in random pkt test",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default="1",
+        help="number of worker processes for the runs in random pkt test",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="base seed for the random pkt test, each run gets its own seed",
+    )
+    parser.add_argument(
+        "--verbose",
+        type=int,
+        default="0",
+        help="""
+        0->only num of pkt received per router
+        1-> L0 + average clk cycles
+        2-> L1 + all packet information
+        3-> L2 + heatmap""",
+    )
+    parser.add_argument(
+        "--print_output",
+        type=str2bool,
+        default=True,
+        help="Whether to print simulator output in terminal",
+    )
+    parser.add_argument(
+        "--sim_data_path",
+        type=str,
+        default="./sim_data.txt",
+        help="path to save the simulation data",
+    )
+    parser.add_argument(
+        "--sim_summary_path",
+        type=str,
+        default="./sim_summary.txt",
+        help="path to save the simulation data summary, for random pkt test",
+    )
+    parser.add_argument(
+        "--stream_traffic",
+        type=str2bool,
+        default=False,
+        help="draw the random pkt test spikes cycle by cycle, for long load_cycles",
+    )
+    parser.add_argument(
+        "--spike_trace",
+        type=str,
+        default=None,
+        help="replay the spikes of this trace file in random pkt test, instead\n"
+        "of the random ones. load_cycles is up to its last spike",
+    )
+    parser.add_argument(
+        "--vectorized",
+        type=str2bool,
+        default=False,
+        help="Run basic XY (algo 0) on the vectorized numpy engine",
+    )
+    parser.add_argument(
+        "--steady_state",
+        type=str2bool,
+        default=False,
+        help="random pkt test stops once the steady state latency and throughput are measured",
+    )
+    parser.add_argument(
+        "--batch_cycles",
+        type=int,
+        default=100,
+        help="cycles per batch for the steady state batch means",
+    )
+    parser.add_argument(
+        "--ci_precision",
+        type=float,
+        default=0.05,
+        help="stop when the 95%% confidence intervals are within this fraction of the means",
+    )
+    parser.add_argument(
+        "--trace_path",
+        type=str,
+        default=None,
+        help="write the received packets to binary traces, 1 per algo and run,\n"
+        "instead of the per packet lines of verbose 2",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str2bool,
+        default=False,
+        help="print the time per phase and router class after each algo",
+    )
+    parser.add_argument(
+        "--console_interval",
+        type=float,
+        default=0.1,
+        help="seconds between the writes to the terminal, the output in\n"
+        "between is written at once",
+    )
+    parser.add_argument(
+        "--heatmap_path",
+        type=str,
+        default=None,
+        help="save the verbose 3 heatmaps to this png or svg file instead of\n"
+        "showing them, rendered in a worker process",
+    )
+    parser.add_argument(
+        "--checkpoint_every",
+        type=int,
+        default=0,
+        help="save a checkpoint every this many cycles, 0 for no checkpoints",
+    )
+    parser.add_argument(
+        "--checkpoint_path",
+        type=str,
+        default="./sim_checkpoint.pkl",
+        help="path to save the checkpoint, overwritten by the next one",
+    )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        default=None,
+        help="checkpoint to continue from, its arguments are used",
+    )
+    return parser
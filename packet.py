@@ -1,37 +1,97 @@
 """ class for packet """
+from array import array
 
 
-class BasePacket:
-    def __init__(self, source_id, dest_coordinates, current_coordinates):
-        self.source_id = source_id
-        self.dest_coordinates = dest_coordinates
-        self.current_coordinates = current_coordinates
+class PacketStore:
+    """
+    Shared by the compact packets of a simulation. Keeps the mesh columns for
+    the coordinates, and the path traces of the packets in 2 arrays. Each
+    entry links back to the previous entry of the same packet. The entries of
+    a freed trace are used again, so the arrays grow with the packets in
+    flight. Without record_traces nothing is kept, the path traces are empty
+    """
 
-    def update_packet(self, current_coordinates):
-        self.update_coordinates(current_coordinates)
+    def __init__(self, n, record_traces=True):
+        self.n = n  # number of columns
+        self.record_traces = record_traces
+        self.trace_router = array("i")
+        self.trace_previous = array("q")  # -1 for the first router
+        self.free_entries = array("q")  # of the freed traces
 
-    def update_coordinates(self, current_coordinates):
-        self.current_coordinates = current_coordinates
+    def add_to_trace(self, trace_offset, router_id):
+        """ add the router after trace_offset, return the new offset """
+        if not self.record_traces:
+            return trace_offset
+        if self.free_entries:
+            entry = self.free_entries.pop()
+            self.trace_router[entry] = router_id
+            self.trace_previous[entry] = trace_offset
+            return entry
+        self.trace_router.append(router_id)
+        self.trace_previous.append(trace_offset)
+        return len(self.trace_router) - 1
 
+    def get_trace(self, trace_offset):
+        """ list of routers of the trace ending at trace_offset """
+        path_trace = []
+        while trace_offset >= 0:
+            path_trace.append(self.trace_router[trace_offset])
+            trace_offset = self.trace_previous[trace_offset]
+        path_trace.reverse()
+        return path_trace
 
-class StatPacket(BasePacket):
-    """ with more variables for statics tracking """
+    def free_trace(self, trace_offset):
+        """ the entries of the trace ending at trace_offset can be used again """
+        while trace_offset >= 0:
+            self.free_entries.append(trace_offset)
+            trace_offset = self.trace_previous[trace_offset]
 
-    def __init__(
-        self, source_id, dest_coordinates, current_coordinates, start_clock_cycle
-    ):
-        super().__init__(source_id, dest_coordinates, current_coordinates)
-        self.path_trace = []
-        self.clock_cycle_taken = 0
+
+class CompactPacket:
+    """
+    Packet with __slots__, no __dict__ per packet. source_id and dest_id
+    are router ids, start_clock_cycle the injection cycle and
+    clock_cycle_taken the latency once stored at the destination. The path
+    trace is kept in the store, trace_offset is its last entry
+    """
+
+    __slots__ = (
+        "store",
+        "source_id",
+        "dest_id",
+        "start_clock_cycle",
+        "clock_cycle_taken",
+        "trace_offset",
+    )
+
+    def __init__(self, store, source_id, dest_id, start_clock_cycle):
+        self.store = store
+        self.source_id = source_id
+        self.dest_id = dest_id
         self.start_clock_cycle = start_clock_cycle
+        self.clock_cycle_taken = 0
+        self.trace_offset = -1  # empty path trace
+
+    @property
+    def dest_coordinates(self):
+        return divmod(self.dest_id, self.store.n)
 
-    def update_packet(self, router_id, current_coordinates):
-        """ overloading parent function """
+    @property
+    def path_trace(self):
+        """ new list every time, changing it does not change the trace """
+        return self.store.get_trace(self.trace_offset)
+
+    def update_packet(self, router_id, current_coordinates=None):
+        """ the router is added to the path trace, its id is enough """
         self.add_router_to_path_trace(router_id)
-        self.update_coordinates(current_coordinates)
 
     def update_clock_cycle(self, current_clock_cycle):
         self.clock_cycle_taken = current_clock_cycle - self.start_clock_cycle
 
     def add_router_to_path_trace(self, router_id):
-        self.path_trace.append(router_id)
+        self.trace_offset = self.store.add_to_trace(self.trace_offset, router_id)
+
+    def free_trace(self):
+        """ the packet is done with, its path trace is emptied """
+        self.store.free_trace(self.trace_offset)
+        self.trace_offset = -1
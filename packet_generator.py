@@ -1,30 +1,39 @@
-from packet import StatPacket
-from network_map import coordinates_2_id, id_2_coordinates
+from packet import CompactPacket, PacketStore
+from network_map import coordinates_2_id
+from spike_trace import SpikeTrace
 import random
 import math
 import numpy as np
-import copy
+from array import array
 
 ### This generator generate random package
 class Generator:
-    def __init__(self, m, n):
+    # record_traces keeps the path traces of the packets, only needed to
+    # print or write them
+    def __init__(self, m, n, record_traces=True):
         self.m = m
         self.n = n
+        self.record_traces = record_traces
         self.packet_sum = 0
+        # shared by all the packets
+        self.packet_store = PacketStore(n, record_traces)
 
     def soft_reset(self):
         self.packet_sum = 0
+        # old packets keep the old one
+        self.packet_store = PacketStore(self.n, self.record_traces)
 
-    # generate a single StatPacket packet according to the user input
+    # generate a single packet according to the user input
     def generate_single(
         self, source_id, dest_coordinates, current_coordinates, current_clock_cycle
     ):
         self.packet_sum += 1
-        return StatPacket(
-            source_id, dest_coordinates, current_coordinates, current_clock_cycle
+        dest_id = coordinates_2_id(dest_coordinates, self.m, self.n)
+        return CompactPacket(
+            self.packet_store, source_id, dest_id, current_clock_cycle
         )
 
-    # generate a random single StatPacket packet, ignore mapping
+    # generate a random single packet, ignore mapping
     def generate_random_single(self, current_clock_cycle):
         has_two_points = False
         while not has_two_points:
@@ -33,8 +42,11 @@ class Generator:
             if ini_point != des_point:  # make sure the two points are not identical
                 has_two_points = True
         source_id = coordinates_2_id(ini_point, self.m, self.n)
+        dest_id = coordinates_2_id(des_point, self.m, self.n)
         self.packet_sum += 1
-        return StatPacket(source_id, des_point, ini_point, current_clock_cycle)
+        return CompactPacket(
+            self.packet_store, source_id, dest_id, current_clock_cycle
+        )
 
     def gen_random_point(self):
         coordinate_x = random.randint(0, self.m - 1)
@@ -50,11 +62,17 @@ class Generator:
 
 class RandomGenerator(Generator):
     # rate should be a value between 0 and 10
-    def __init__(self, m, n, rate=5, load_cycles=10):
-        super().__init__(m, n)
+    # seed gives the generator its own random state, else numpy global one
+    def __init__(
+        self, m, n, rate=5, load_cycles=10, seed=None, record_traces=True
+    ):
+        super().__init__(m, n, record_traces)
         self.rate = rate
-        # store packets for send for each node
-        self.packets = [[] for j in range(m * n)]
+        self.rng = np.random if seed is None else np.random.RandomState(seed)
+        # store the workload for each node as records, (cycle, dest) arrays
+        # the packets are only created when they are sent
+        self.packet_cycles = [array("i") for j in range(m * n)]
+        self.packet_dests = [array("i") for j in range(m * n)]
         self.current_pkt_index = [0 for j in range(m * n)]
 
         # create the map
@@ -81,7 +99,7 @@ class RandomGenerator(Generator):
         self.pre_generate_pkt(load_cycles)
 
     def soft_reset(self):
-        self.packet_sum = 0
+        super().soft_reset()
         self.current_pkt_index = [0 for j in range(self.m * self.n)]
 
     def get_layer_no(self, node_id):
@@ -96,75 +114,256 @@ class RandomGenerator(Generator):
         """
         for router_id in range(self.m * self.n):
             for current_clock_cycle in range(load_cycles):
-                if np.random.uniform(0, 10) > (10 - self.rate):
+                if self.rng.uniform(0, 10) > (10 - self.rate):
                     # if the random number is greater than the rate
                     self.generate_packets(router_id, current_clock_cycle)
 
-    # generate a list of packet which follows the mapping guideline
+    # generate the packet records which follow the mapping guideline
     def generate_packets(self, source_id, current_clock_cycle):
-        ini_coordinates = id_2_coordinates(source_id, self.m, self.n)
         ini_layer = self.get_layer_no(source_id)
         if ini_layer + 1 < len(self.nodes_map):  # if not the last layer
+            # dest must from the next layer
             node_no = self.nodes_map[ini_layer + 1][0]
             last_node = self.nodes_map[ini_layer + 1][1]
-            node_packets = []
-            while node_no <= last_node:  # dest must from the next layer
-                dest_coordinates = id_2_coordinates(node_no, self.m, self.n)
-                node_packets.append(
-                    StatPacket(
-                        source_id,
-                        dest_coordinates,
-                        ini_coordinates,
-                        current_clock_cycle,
-                    )
-                )
-                node_no += 1
-            self.packets[source_id] += node_packets
+            self.packet_dests[source_id].extend(range(node_no, last_node + 1))
+            self.packet_cycles[source_id].extend(
+                [current_clock_cycle] * (last_node + 1 - node_no)
+            )
 
     def get_pkt_list(self, router_id, current_clock_cycle):
         pkt_list = []
         pkt_index = self.current_pkt_index[router_id]
-        # print((self.packets[router_id]))
-        if pkt_index < (len(self.packets[router_id])):  # has packet
-            # check if the pkt is for current cycle
-            pkt = self.packets[router_id][pkt_index]
-            while pkt.start_clock_cycle == current_clock_cycle:
-                pkt = copy.deepcopy(self.packets[router_id][pkt_index])  # copy pkt
-                pkt_list.append(pkt)
-                self.packet_sum += 1
-                pkt_index += 1
-                # prepare for next loop
-                try:  # next packet might be end of list
-                    pkt = self.packets[router_id][pkt_index]
-                except IndexError:
-                    break
+        packet_cycles = self.packet_cycles[router_id]
+        packet_dests = self.packet_dests[router_id]
+        # the records are in cycle order, take the ones for current cycle
+        while (
+            pkt_index < len(packet_cycles)
+            and packet_cycles[pkt_index] == current_clock_cycle
+        ):
+            pkt_list.append(
+                CompactPacket(
+                    self.packet_store,
+                    router_id,
+                    packet_dests[pkt_index],
+                    current_clock_cycle,
+                )
+            )
+            pkt_index += 1
+        self.packet_sum += len(pkt_list)
 
         self.current_pkt_index[router_id] = pkt_index  # save the index
         return pkt_list
 
+    def get_cycle_packets(self, current_clock_cycle):
+        """ (router id, packet list) of the routers sending in the cycle """
+        for router_id in range(self.m * self.n):
+            pkt_list = self.get_pkt_list(router_id, current_clock_cycle)
+            if pkt_list:
+                yield router_id, pkt_list
+
+
+class StreamGenerator(RandomGenerator):
+    """
+    Traffic statistically equivalent to RandomGenerator, same rate and dests,
+    but the spikes are drawn cycle by cycle instead of generated in advance,
+    memory does not grow with load_cycles. The spikes of all the routers are
+    drawn at once for each cycle from a seeded numpy Generator of its own, so
+    the packets differ from RandomGenerator for the same seed. soft_reset
+    restarts the same stream.
+    """
+
+    def __init__(
+        self, m, n, rate=5, load_cycles=10, seed=None, record_traces=True
+    ):
+        if seed is None:  # still need a seed to replay the stream
+            seed = np.random.randint(2 ** 31)
+        self.seed = seed
+        super().__init__(
+            m,
+            n,
+            rate=rate,
+            load_cycles=load_cycles,
+            seed=seed,
+            record_traces=record_traces,
+        )
+
+    def pre_generate_pkt(self, load_cycles):
+        """ nothing generated in advance, only the dest range of the nodes """
+        self.load_cycles = load_cycles
+        number_of_routers = self.m * self.n
+        self.has_dest = np.zeros(number_of_routers, dtype=bool)
+        self.dest_range = [None for j in range(number_of_routers)]
+        for router_id in range(number_of_routers):
+            ini_layer = self.get_layer_no(router_id)
+            if ini_layer + 1 < len(self.nodes_map):  # if not the last layer
+                # dest must from the next layer
+                node_no = self.nodes_map[ini_layer + 1][0]
+                last_node = self.nodes_map[ini_layer + 1][1]
+                self.dest_range[router_id] = range(node_no, last_node + 1)
+                self.has_dest[router_id] = True
+        self.soft_reset()
+
+    def soft_reset(self):
+        super().soft_reset()
+        self.stream_rng = np.random.default_rng(self.seed)
+        self.stream_cycle = -1  # last cycle drawn
+        self.spikes = np.zeros(self.m * self.n, dtype=bool)
+
+    def draw_cycle(self, current_clock_cycle):
+        """ spikes of all the routers, 1 draw per cycle even if not asked """
+        if current_clock_cycle <= self.stream_cycle:
+            raise ValueError(
+                "cycle %d already drawn, the stream is at cycle %d"
+                % (current_clock_cycle, self.stream_cycle)
+            )
+        while self.stream_cycle < current_clock_cycle:
+            self.stream_cycle += 1
+            spikes = self.stream_rng.uniform(0, 10, self.m * self.n) > (
+                10 - self.rate
+            )
+        self.spikes = spikes & self.has_dest
+
+    def get_pkt_list(self, router_id, current_clock_cycle):
+        if current_clock_cycle >= self.load_cycles:
+            return []
+        if current_clock_cycle != self.stream_cycle:
+            self.draw_cycle(current_clock_cycle)
+        if not self.spikes[router_id]:
+            return []
+        pkt_list = [
+            CompactPacket(self.packet_store, router_id, dest_id, current_clock_cycle)
+            for dest_id in self.dest_range[router_id]
+        ]
+        self.packet_sum += len(pkt_list)
+        return pkt_list
+
+    def get_cycle_packets(self, current_clock_cycle):
+        """ only the spiking routers are visited """
+        if current_clock_cycle >= self.load_cycles:
+            return
+        if current_clock_cycle != self.stream_cycle:
+            self.draw_cycle(current_clock_cycle)
+        for router_id in np.flatnonzero(self.spikes).tolist():
+            yield router_id, self.get_pkt_list(router_id, current_clock_cycle)
+
+
+class TraceGenerator(Generator):
+    """
+    Replays the spikes of a spike trace file, each record injected as its
+    cycle is reached. The file is memmapped and read window_rows records at
+    a time, with their dests, so memory does not grow with the trace.
+    Checked by window: routers in the mesh, cycles in order.
+    """
+
+    def __init__(self, m, n, path, window_rows=65536, record_traces=True):
+        super().__init__(m, n, record_traces)
+        self.path = path
+        self.window_rows = window_rows
+        self.open_trace()
+        self.soft_reset()
+
+    def open_trace(self):
+        self.trace = SpikeTrace(self.path)
+        self.load_cycles = self.trace.cycle_count
+
+    def soft_reset(self):
+        super().soft_reset()
+        self.record_index = 0  # next record to inject
+        self.window_start = 0  # records [window_start, window_end) in lists
+        self.window_end = 0
+
+    def load_window(self):
+        """ the records from record_index and their dests, as lists """
+        start = self.record_index
+        end = min(start + self.window_rows, len(self.trace))
+        records = np.array(self.trace.records[start:end])
+        dest_start = int(records["dest_offset"][0])
+        dest_end = int(records["dest_offset"][-1] + records["dest_count"][-1])
+        dests = np.array(self.trace.all_dests[dest_start:dest_end])
+
+        number_of_routers = self.m * self.n
+        cycles = records["cycle"]
+        previous_cycle = int(self.trace.records[start - 1]["cycle"]) if start else -1
+        if cycles[0] < previous_cycle or np.any(cycles[1:] < cycles[:-1]):
+            raise ValueError("%s: spikes not in cycle order" % self.path)
+        for name, ids in (("source", records["source"]), ("dest", dests)):
+            if len(ids) and (ids.min() < 0 or ids.max() >= number_of_routers):
+                raise ValueError(
+                    "%s: %s router out of the %dx%d mesh"
+                    % (self.path, name, self.m, self.n)
+                )
+        self.window_start = start
+        self.window_end = end
+        self.window_cycles = cycles.tolist()
+        self.window_sources = records["source"].tolist()
+        self.window_offsets = (records["dest_offset"] - dest_start).tolist()
+        self.window_counts = records["dest_count"].tolist()
+        self.window_dests = dests.tolist()
+
+    def get_cycle_packets(self, current_clock_cycle):
+        """ (router id, packet list) of the records up to the cycle """
+        record_count = len(self.trace)
+        while self.record_index < record_count:
+            if self.record_index == self.window_end:
+                self.load_window()
+            row = self.record_index - self.window_start
+            if self.window_cycles[row] > current_clock_cycle:
+                return
+            offset = self.window_offsets[row]
+            dests = self.window_dests[offset : offset + self.window_counts[row]]
+            router_id = self.window_sources[row]
+            pkt_list = [
+                CompactPacket(
+                    self.packet_store, router_id, dest_id, current_clock_cycle
+                )
+                for dest_id in dests
+            ]
+            self.packet_sum += len(pkt_list)
+            self.record_index += 1
+            yield router_id, pkt_list
+
+    WINDOW_LISTS = (
+        "window_cycles",
+        "window_sources",
+        "window_offsets",
+        "window_counts",
+        "window_dests",
+    )
+
+    def __getstate__(self):
+        """ the position in the trace, the memmap and window read again """
+        state = self.__dict__.copy()
+        del state["trace"]
+        for name in self.WINDOW_LISTS:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.open_trace()
+        self.window_start = self.window_end = self.record_index
+
 
 # congestion generator
 class ConstGenerator(Generator):
-    def __init__(self, m, n):
-        super().__init__(m, n)
-        self.dest_coordinates = (m - 1, n - 1)  # send to the last node
+    def __init__(self, m, n, record_traces=True):
+        super().__init__(m, n, record_traces)
+        self.dest_id = m * n - 1  # send to the last node
 
     def get_packet(self, router_id, current_clock_cycle, is_empty):
         if (
             int(router_id / self.n) == router_id % self.n
             and router_id != self.m * self.n - 1
         ):  # node on diagonal and not the last node
-            ini_coordinates = id_2_coordinates(router_id, self.m, self.n)
-            pkt = StatPacket(
-                router_id, self.dest_coordinates, ini_coordinates, current_clock_cycle
+            pkt = CompactPacket(
+                self.packet_store, router_id, self.dest_id, current_clock_cycle
             )
             self.packet_sum += 1
         elif (int(router_id % self.n) == self.n - 1) and (
             router_id != self.m * self.n - 1
         ):
-            ini_coordinates = id_2_coordinates(router_id, self.m, self.n)
-            pkt = StatPacket(
-                router_id, self.dest_coordinates, ini_coordinates, current_clock_cycle
+            pkt = CompactPacket(
+                self.packet_store, router_id, self.dest_id, current_clock_cycle
             )
             self.packet_sum += 1
         else:
@@ -0,0 +1,208 @@
+"""
+Module: packet_trace
+Desp:   binary columnar trace of the received packets, read with numpy memmap
+version: 0.0.4
+
+requirements: numpy
+
+Changelog:  0.0.1 - initial release
+            0.0.2 - trace[i] reads 1 record, 1 chunk columns as views
+            0.0.3 - close of a closed writer does nothing
+            0.0.4 - the last chunk only has its records, no padding (file
+                    version 2)
+
+File:   header of HEADER_SIZE bytes, then chunks of chunk_rows records. A
+        chunk has the columns one after the other, the last one only has
+        the records left, sized from record_count. Version 1 files have it
+        padded to chunk_rows. The paths of all the packets are router ids (int32)
+        in <path>.paths, a record has the offset of its path in there.
+"""
+import operator
+import numpy as np
+from array import array
+
+MAGIC = b"NOCTRACE"
+VERSION = 2
+HEADER_SIZE = 64
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S8"),
+        ("version", "<u4"),
+        ("chunk_rows", "<u4"),
+        ("record_count", "<u8"),
+        ("path_count", "<u8"),
+    ]
+)
+# name, numpy type and array type code of the columns
+TRACE_COLUMNS = [
+    ("source", "<i4", "i"),
+    ("dest", "<i4", "i"),
+    ("injection_cycle", "<i8", "q"),
+    ("latency", "<i8", "q"),
+    ("hops", "<i4", "i"),
+    ("path_offset", "<i8", "q"),
+]
+
+
+class PacketTraceWriter:
+    """
+    The records are kept per column until chunk_rows of them, then written
+    as a chunk. Memory stays at 1 chunk whatever the number of packets.
+    Picklable for the checkpoints, the files are reopened at their size.
+    """
+
+    def __init__(self, path, chunk_rows=65536):
+        self.path = path
+        self.paths_path = path + ".paths"
+        self.chunk_rows = chunk_rows
+        self.record_count = 0
+        self.path_count = 0
+        self.columns = [
+            array(type_code) for name, dtype, type_code in TRACE_COLUMNS
+        ]
+        self.paths = array("i")  # not written yet
+        self.file = open(self.path, "wb")
+        self.file.write(bytes(HEADER_SIZE))  # filled in by close
+        self.paths_file = open(self.paths_path, "wb")
+
+    def append(self, packet):
+        """ record of a packet stored at its destination """
+        path_trace = packet.path_trace
+        source, dest, injection_cycle, latency, hops, path_offset = self.columns
+        source.append(packet.source_id)
+        dest.append(packet.dest_id)
+        injection_cycle.append(packet.start_clock_cycle)
+        latency.append(packet.clock_cycle_taken)
+        hops.append(max(len(path_trace) - 1, 0))  # links, the source included
+        path_offset.append(self.path_count)
+        self.paths.extend(path_trace)
+        self.path_count += len(path_trace)
+        self.record_count += 1
+        if len(source) == self.chunk_rows:
+            self.write_chunk()
+
+    def write_chunk(self):
+        """ the columns so far as a chunk, the last one can be shorter """
+        for (name, dtype, type_code), column in zip(TRACE_COLUMNS, self.columns):
+            self.file.write(np.asarray(column, dtype=dtype).tobytes())
+            del column[:]
+        self.paths_file.write(np.asarray(self.paths, dtype="<i4").tobytes())
+        del self.paths[:]
+
+    def close(self):
+        if self.file.closed:
+            return
+        if len(self.columns[0]):
+            self.write_chunk()
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["version"] = VERSION
+        header["chunk_rows"] = self.chunk_rows
+        header["record_count"] = self.record_count
+        header["path_count"] = self.path_count
+        self.file.seek(0)
+        self.file.write(header.tobytes())
+        self.file.close()
+        self.paths_file.close()
+
+    def __getstate__(self):
+        """ the files as their sizes """
+        self.file.flush()
+        self.paths_file.flush()
+        state = self.__dict__.copy()
+        state["file"] = self.file.tell()
+        state["paths_file"] = self.paths_file.tell()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.file = self.reopen(self.path, state["file"])
+        self.paths_file = self.reopen(self.paths_path, state["paths_file"])
+
+    @staticmethod
+    def reopen(path, size):
+        """ continue the file from the size it had, anything after is dropped """
+        f = open(path, "r+b")
+        f.truncate(size)
+        f.seek(size)
+        return f
+
+
+class PacketTrace:
+    """
+    Reads a trace file with memmap, trace[i] is record i as a dict,
+    trace["latency"] the column of all the records, trace.path(i) the
+    routers of record i. chunks is the list of the memmapped chunks
+    """
+
+    def __init__(self, path):
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header["magic"][0] != MAGIC:
+            raise ValueError("%s is not a closed packet trace" % path)
+        self.chunk_rows = int(header["chunk_rows"][0])
+        self.record_count = int(header["record_count"][0])
+        full_chunks, last_rows = divmod(self.record_count, self.chunk_rows)
+        if int(header["version"][0]) == 1 and last_rows:  # padded last chunk
+            full_chunks, last_rows = full_chunks + 1, 0
+        self.chunks = []
+        offset = HEADER_SIZE
+        for count, rows in ((full_chunks, self.chunk_rows), (1, last_rows)):
+            if count == 0 or rows == 0:
+                continue
+            chunk_dtype = np.dtype(
+                [(name, dtype, (rows,)) for name, dtype, type_code in TRACE_COLUMNS]
+            )
+            chunks = np.memmap(
+                path, dtype=chunk_dtype, mode="r", offset=offset, shape=(count,)
+            )
+            self.chunks.extend(chunks)  # views, nothing read
+            offset += count * chunk_dtype.itemsize
+        if int(header["path_count"][0]):
+            self.paths = np.memmap(path + ".paths", dtype="<i4", mode="r")
+        else:
+            self.paths = np.zeros(0, dtype="<i4")
+
+    def __len__(self):
+        return self.record_count
+
+    def __getitem__(self, key):
+        """
+        the record at an index, only its chunk row read. For a column name,
+        a view for 1 chunk and a copy of the column for more, so the single
+        values are read with trace[i] or field
+        """
+        if isinstance(key, str):
+            if len(self.chunks) == 1:
+                return self.chunks[0][key][: self.record_count]
+            if not self.chunks:
+                dtype = {name: dtype for name, dtype, type_code in TRACE_COLUMNS}
+                return np.zeros(0, dtype=dtype[key])
+            column = np.concatenate([chunk[key] for chunk in self.chunks])
+            return column[: self.record_count]
+        index = operator.index(key)
+        if index < 0:
+            index += self.record_count
+        if not 0 <= index < self.record_count:
+            raise IndexError("record %d out of %d" % (key, self.record_count))
+        chunk, row = divmod(index, self.chunk_rows)
+        record = self.chunks[chunk]  # no copy, a view of the chunk
+        return {
+            name: int(record[name][row]) for name, dtype, type_code in TRACE_COLUMNS
+        }
+
+    def chunk(self, index):
+        """ the columns of 1 chunk as views """
+        chunk = self.chunks[index]
+        rows = min(self.chunk_rows, self.record_count - index * self.chunk_rows)
+        return {name: chunk[name][:rows] for name, dtype, type_code in TRACE_COLUMNS}
+
+    def path(self, index):
+        """ routers of the path of record index """
+        offset = self.field("path_offset", index)
+        hops = self.field("hops", index)
+        return self.paths[offset : offset + hops + 1]
+
+    def field(self, name, index):
+        """ 1 value without reading the column """
+        chunk, row = divmod(index, self.chunk_rows)
+        return int(self.chunks[chunk][name][row])
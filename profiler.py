@@ -0,0 +1,142 @@
+"""
+Module: profiler
+Desp:   time and calls per phase of the cycle loop, by class, for --profile
+version: 0.0.4
+
+requirements: active_set.py, vector_engine.py
+
+Changelog:  0.0.1 - initial release
+            0.0.2 - the times cleared by reset
+            0.0.3 - send and prepare phases of ActiveSet timed instead of a
+                    copy of its run_cycle, timed functions picked before the
+                    test loops
+            0.0.4 - send phase and prepare phase rows for what they time,
+                    the scheduling included, no scheduling row
+"""
+import functools
+import time
+
+from active_set import ActiveSet
+from vector_engine import VectorXYEngine
+
+# order of the phases in the table
+PHASES = [
+    "injection",
+    "send phase",  # the routers run in order, their send_controller
+    "prepare phase",  # prepare_next_cycle, the drained routers made idle
+    "termination check",
+    "stats collection",
+]
+
+
+class PhaseProfiler:
+    """
+    Cumulative time and calls by phase and class. The time of a phase does
+    not include the phases timed inside it.
+    """
+
+    def __init__(self):
+        self.records = {}  # [calls, seconds] by (phase, class name)
+        self.inner_time = 0.0  # of the phases timed inside the current one
+
+    def add(self, phase, owner, seconds):
+        record = self.records.get((phase, owner))
+        if record is None:
+            self.records[(phase, owner)] = [1, seconds]
+        else:
+            record[0] += 1
+            record[1] += seconds
+
+    def call(self, phase, owner, function, *args):
+        """ call the function, timed as the phase """
+        outer_inner_time = self.inner_time
+        self.inner_time = 0.0
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        self.add(phase, owner, elapsed - self.inner_time)
+        self.inner_time = outer_inner_time + elapsed
+        return result
+
+    def timed(self, phase, owner, function):
+        """ the function timed as the phase, to pick once before a loop """
+        return functools.partial(self.call, phase, owner, function)
+
+    def table(self):
+        """ text table of the phases, the slowest class first in a phase """
+        total_time = sum(seconds for calls, seconds in self.records.values())
+        out_str = "%-20s %-16s %10s %10s %14s %6s\n" % (
+            "phase",
+            "class",
+            "calls",
+            "total (s)",
+            "per call (us)",
+            "%",
+        )
+        records = sorted(
+            self.records.items(),
+            key=lambda item: (PHASES.index(item[0][0]), -item[1][1]),
+        )
+        for (phase, owner), (calls, seconds) in records:
+            out_str += "%-20s %-16s %10d %10.4f %14.2f %6.1f\n" % (
+                phase,
+                owner,
+                calls,
+                seconds,
+                seconds / calls * 1e6,
+                seconds / total_time * 100 if total_time > 0 else 0.0,
+            )
+        out_str += "%-20s %-16s %10s %10.4f\n" % ("total", "", "", total_time)
+        return out_str
+
+
+class ProfiledActiveSet(ActiveSet):
+    """ ActiveSet with its send and prepare phases timed, by router class """
+
+    def __init__(self, router_list):
+        super().__init__(router_list)
+        self.profiler = PhaseProfiler()
+        self.router_class = type(router_list[0]).__name__  # 1 class per network
+
+    def reset(self):
+        super().reset()
+        self.profiler = PhaseProfiler()
+
+    def send_phase(self, current_clock_cycle):
+        return self.profiler.call(
+            "send phase",
+            self.router_class,
+            super().send_phase,
+            current_clock_cycle,
+        )
+
+    def prepare_phase(self, served_routers, current_clock_cycle):
+        self.profiler.call(
+            "prepare phase",
+            self.router_class,
+            super().prepare_phase,
+            served_routers,
+            current_clock_cycle,
+        )
+
+
+class ProfiledVectorXYEngine(VectorXYEngine):
+    """ VectorXYEngine with the 2 steps of the cycle timed """
+
+    def __init__(self, topology, receiver_list, buffer_size=4):
+        super().__init__(topology, receiver_list, buffer_size)
+        self.profiler = PhaseProfiler()
+
+    def reset(self):
+        super().reset()
+        self.profiler = PhaseProfiler()
+
+    def run_cycle(self, current_clock_cycle):
+        call = self.profiler.call
+        call(
+            "send phase",
+            "VectorXYEngine",
+            self.send_controller,
+            current_clock_cycle,
+        )
+        call("prepare phase", "VectorXYEngine", self.prepare_next_cycle)
@@ -1,50 +1,107 @@
 """
 Module: random_pkt_test
 Desp:   random pkt test for NoC loading
-version: 0.0.1
+version: 0.2.8
 
 requirements:   sub_simulator_func.py
                 packet_generator.py
                 heatmap.py
 
 Changelog:  0.0.1 - initial release
+            0.0.2 - option to run basic XY on the vectorized engine
+            0.0.3 - only run the routers with packets, use pkt count to end
+            0.1.0 - runs and algos as independent tasks, in a process pool
+                    with --jobs. Seeded generator per run
+            0.1.1 - return the result records with latency statistics
+            0.1.2 - generator of the run reused by its algos in the process
+            0.1.3 - streaming traffic option, only the sending routers visited
+            0.1.4 - heatmap from the traversal count of the network
+            0.1.5 - compiled mesh topology instead of networkx graph
+            0.1.6 - checkpoints every checkpoint_every cycles, resume a run
+                    from a checkpoint
+            0.1.7 - warm-up detection and batch means stop with --steady_state
+            0.1.8 - phase timing table with --profile
+            0.1.9 - binary packet trace with --trace_path
+            0.2.0 - sim data and summary written by a background thread
+            0.2.1 - heatmap to a file with --heatmap_path, matplotlib imported
+                    only for the heatmap
+            0.2.2 - replay of a recorded spike trace with --spike_trace
+            0.2.3 - the cycles of a task run by a Simulation, the generator
+                    cache moved to simulation.py
+            0.2.4 - the checkpoints save the sim data offset and the size of
+                    the results file, not the text and results of the tasks
+                    done. Their text is not written again on resume
+            0.2.5 - worker processes spawned instead of forked
+            0.2.6 - load cycles of a spike trace set on a copy of the
+                    arguments, warning for a cycle limit below the trace
+            0.2.7 - results kept by algo type, the runs stopped by the cycle
+                    limit kept with cycle_taken None
+            0.2.8 - terminal output only captured in the worker processes,
+                    printed as it goes with 1 job
 """
 
 import argparse
+import contextlib
+import copy
+import functools
+import io
+import multiprocessing
 import time
 import numpy as np
 
-import sub_simulator_func as sim_func
+from concurrent.futures import ProcessPoolExecutor
 
-from packet_generator import RandomGenerator
+import sub_simulator_func as sim_func
 
-from heatmap import heatmap_display
-from heatmap import heatmap_multiple_display
+from checkpoint import RecordFile
+from checkpoint import save_checkpoint
+from log_sink import open_log
+from simulation import Simulation
+from spike_trace import SpikeTrace
 
 
-def sub_simulator(args, noc_map, noc_map_nodes):
+def sub_simulator(args, topology, resume=None):
     m, n = args.m, args.n
     algo_type = args.algo_type
-    cycle_limit = args.cycle_limit
-    load_cycles = args.load_cycles
-    target_rate = args.target_rate  # special for random generator
     number_of_runs = args.runs
-    algo_type = args.algo_type
     verbose = args.verbose
-    print_output = args.print_output
+    jobs = args.jobs
     sim_data_path = args.sim_data_path
     sim_summary_path = args.sim_summary_path
-    number_of_routers = m * n
     noc_heatmap_list = []
-    cycle_taken = [[] for j in range(number_of_runs)]  # order by runs
-    packet_sent = [[] for j in range(number_of_runs)]
-    throughput = [[] for j in range(number_of_runs)]
+    # order by runs, then by algo type. cycle_taken is None for the runs
+    # stopped by the cycle limit
+    cycle_taken = [{} for j in range(number_of_runs)]
+    packet_sent = [{} for j in range(number_of_runs)]
+    steady_throughput = [{} for j in range(number_of_runs)]
 
-    fout = open(sim_data_path, "w")
-    fsum = open(sim_summary_path, "w")
+    if resume is None:
+        fout = open_log(sim_data_path)
+    else:  # the text of the tasks done is in the file, up to the offset
+        fout = open_log(sim_data_path, resume["log_offset"])
+    fsum = open_log(sim_summary_path)
 
     if number_of_runs > 1 and verbose == 3:
         print("Warning: verbose 3 not supported in multiple runs")
+    if args.spike_trace is not None:  # injected up to the last spike
+        args = copy.copy(args)  # the caller's arguments kept as given
+        args.load_cycles = SpikeTrace(args.spike_trace).cycle_count
+        out_str = "spike trace %s, load cycles = %d\n" % (
+            args.spike_trace,
+            args.load_cycles,
+        )
+        fout.write(out_str)
+        print(out_str, end="")
+        if args.cycle_limit < args.load_cycles:
+            print(
+                "Warning: cycle limit %d below the load cycles, only the spikes "
+                "before it are replayed" % args.cycle_limit
+            )
+        if number_of_runs > 1:
+            print("Warning: every run replays the same spike trace")
+    if args.checkpoint_every > 0 and jobs > 1:
+        print("Warning: checkpoints only saved with 1 job, running in 1 job")
+        jobs = 1
 
     # set the algo types to run
     if algo_type == 5:  # loop all
@@ -52,92 +109,219 @@ def sub_simulator(args, noc_map, noc_map_nodes):
     else:  # only run the selected one
         algo_type_list = [algo_type]
 
+    # the results of the tasks done are kept in a file for the checkpoints
+    results_file = None
+    if args.checkpoint_every > 0:
+        results_path = args.checkpoint_path + ".results"
+        if resume is None:
+            results_file = RecordFile(results_path)
+        else:
+            results_file = RecordFile(results_path, resume["results_size"])
+
+    # every (run, algo) pair is independent, the run seed gives the same packets
+    if resume is None:
+        run_seeds = get_run_seeds(args.seed, number_of_runs)
+        done_results = []
+    else:  # same seeds, the finished tasks are not run again
+        run_seeds = resume["run_seeds"]
+        done_results = results_file.records()
+    task_runs = [run for run in range(number_of_runs) for algo in algo_type_list]
+    task_algos = algo_type_list * number_of_runs
+    task_seeds = [run_seeds[run] for run in task_runs]
+    task_resumes = [None] * len(task_runs)
+    if resume is not None:
+        task_resumes[len(done_results)] = resume["task"]
+    del task_runs[: len(done_results)]
+    del task_algos[: len(done_results)]
+    del task_seeds[: len(done_results)]
+    del task_resumes[: len(done_results)]
+
+    result_list = []
+    checkpoint = None
+    if args.checkpoint_every > 0:
 
-    # run the simulation
-    for run in range(number_of_runs):
+        def checkpoint(task_state, router_list):
+            """ the tasks before are done, their results already handled """
+            state = {
+                "args": args,
+                "run_seeds": run_seeds,
+                "log_offset": fout.offset(),
+                "results_size": results_file.size(),
+                "task": task_state,
+            }
+            save_checkpoint(args.checkpoint_path, state, router_list)
+
+    def run_header(run):
         out_str = "-------- Algo %d - Run %d --------\n" % (algo_type, run)
         fout.write(out_str)
         print(out_str, end="")
 
-        # init the packet generator to be used for the run
-        generator = RandomGenerator(
-            m, n, rate=target_rate, load_cycles=load_cycles,
-        )  # greater the rate, less likely packets are generated
-
+    def collect(result):
+        run, algo = result["run"], result["algo_type"]
+        cycle_taken[run][algo] = result["cycle_taken"]
+        packet_sent[run][algo] = result["packet_sent"]
+        steady_throughput[run][algo] = result.get("steady_throughput")
+        noc_heatmap_list.append(result["noc_heatmap"])
+        result_list.append(result)
 
-        for algo_type in algo_type_list:
-            args.algo_type = algo_type  # edit the algo_type
-            out_str = "*************** For algo %d ***************\n" % algo_type
-            fout.write(out_str)
-            print(out_str, end="")
+    for result in done_results:  # their text is already written
+        collect(result)
 
-            start_time = time.time()
-            # create the routers and map them
-            router_list, receiver_list = sim_func.create_router_list(
-                args, noc_map, noc_map_nodes,
+    def handle(result):
+        fout.write(result["log"])
+        print(result["console"], end="")
+        collect(result)
+        if results_file is not None:  # the text is in the sim data file
+            results_file.append(
+                {
+                    name: value
+                    for name, value in result.items()
+                    if name not in ("log", "console")
+                }
             )
 
-            # soft reset the stats in generator
-            generator.soft_reset()
-
-            # number of cycles to simulate for single packet testing
-            for current_clock_cycle in range(cycle_limit):
-
-                if current_clock_cycle < load_cycles:
-                    empty_flag = False  # prevent early termination
-                else:
-                    empty_flag = True
-
-                """ set up the testing packets in each cycle """
-                for router in router_list:
-                    # each router have possibility to initiate packet
-                    pk_list = generator.get_pkt_list(
-                        router.id,
-                        current_clock_cycle,
-                    )
-                    if pk_list is not None:  # no packet from this router
-                        router.packet_in_all(pk_list)
-
-                """ This is to run the routers for 1 cycle to send out pkt """
-                for router_id in range(number_of_routers):
-                    # check if the router is empty for early cycle termination
-                    is_empty = router_list[router_id].empty_buffers()
-                    if not is_empty:
-                        empty_flag = False
-
-                    # let router handles the background check
-                    router_list[router_id].send_controller(current_clock_cycle)
-
-                # loop 2nd time to set the next output packet in the router's buffers
-                for router_id in range(number_of_routers):
-                    router_list[router_id].prepare_next_cycle()
-
-                # if current_clock_cycle % 100 == 0:  # for debugging
-                #     print("current_clock_cycle = ", current_clock_cycle)
-
-                if empty_flag:  # all routers has cleared their buffer
-                    cycle_taken[run].append(current_clock_cycle)
-                    str1 = "ending cycle = %d\n" % current_clock_cycle
-                    fout.write(str1)
-                    print(str1, end="")
-                    break
-
-            print("--- time taken: %s seconds ---" % (time.time() - start_time))  # time
-            print("--- Total packets sent: %s ---" % (generator.get_packet_sent_sum()))
-            # collect the statistics
-            noc_heatmap = sim_func.stats_collection(receiver_list, fout, args)
-            noc_heatmap_list.append(noc_heatmap)
-            packet_sent[run].append(generator.get_packet_sent_sum())
+    # run the simulation, results come back in the task order
+    if jobs > 1:
+        # spawned, a fork could copy a lock held by the log writer threads
+        task = functools.partial(run_algo, args, topology, capture_console=True)
+        with ProcessPoolExecutor(
+            max_workers=jobs, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            for result in executor.map(task, task_runs, task_algos, task_seeds):
+                if result["algo_type"] == algo_type_list[0]:  # start of the run
+                    run_header(result["run"])
+                handle(result)
+    else:  # printed as it goes
+        task = functools.partial(run_algo, args, topology, checkpoint=checkpoint)
+        for run, algo, run_seed, task_resume in zip(
+            task_runs, task_algos, task_seeds, task_resumes
+        ):
+            # the header of a resumed task is in the sim data already
+            if algo == algo_type_list[0] and task_resume is None:
+                run_header(run)
+            handle(task(run, algo, run_seed, task_resume))
+
+    if results_file is not None:
+        results_file.close()
 
     # summary for the runs
-    sim_func.summary(packet_sent, cycle_taken, fsum)
+    if args.steady_state:
+        sim_func.summary(packet_sent, cycle_taken, fsum, steady_throughput)
+    else:
+        sim_func.summary(packet_sent, cycle_taken, fsum)
 
     # final output for heat map, only for 1 run
     if verbose == 3 and number_of_runs == 1:
-        if len(noc_heatmap_list) == 1:
-            heatmap_display(noc_heatmap_list[0], algo_type)
-        else:
-            heatmap_multiple_display(noc_heatmap_list)
+        sim_func.heatmap_output(noc_heatmap_list, algo_type, args.heatmap_path)
 
     fout.close()
     fsum.close()
+    return result_list
+
+
+def get_run_seeds(seed, number_of_runs):
+    """
+    seed for the generator of each run. Without a seed, the base seed is
+    drawn from numpy global random state
+    """
+    if seed is None:
+        seed = np.random.randint(2 ** 31)
+    return np.random.SeedSequence(seed).generate_state(number_of_runs).tolist()
+
+
+def run_algo(
+    args,
+    topology,
+    run,
+    algo_type,
+    run_seed,
+    resume=None,
+    checkpoint=None,
+    capture_console=False,
+):
+    """
+    Func: simulate 1 algo for 1 run, can run in a worker process.
+    Return the result record, the text for sim_data.txt included. The
+    terminal output is printed, or returned too with capture_console for
+    the worker processes. The cycles are run by a Simulation of the
+    arguments. resume is the saved task state to continue from, checkpoint
+    is called with the task state every checkpoint_every cycles
+    """
+    args = copy.copy(args)
+    args.algo_type = algo_type  # edit the algo_type
+
+    fout = io.StringIO()
+    console = io.StringIO()
+    if capture_console:
+        output = contextlib.redirect_stdout(console)
+    else:
+        output = contextlib.nullcontext()
+    with output:
+        start_time = time.time()
+        if resume is None:
+            out_str = "*************** For algo %d ***************\n" % algo_type
+            fout.write(out_str)
+            print(out_str, end="")
+
+            # create the routers and map them, the packets of the run seed
+            simulation = Simulation.from_args(args, topology)
+            simulation.reset(run_seed, run=run)
+        else:  # continue from the saved cycle
+            fout.write(resume["log"])
+            simulation = resume["simulation"]
+            simulation.resumed()  # the next algos of the run replay it
+        network = simulation.network
+        receiver_list = simulation.receiver_list
+        generator = simulation.generator
+        profiler = simulation.profiler
+
+        # run up to each checkpoint, or to the end
+        checkpoint_every = args.checkpoint_every if checkpoint is not None else 0
+        while not simulation.finished:
+            if checkpoint_every > 0:
+                cycles = checkpoint_every - (
+                    simulation.current_clock_cycle % checkpoint_every
+                )
+            else:
+                cycles = args.cycle_limit
+            if not simulation.step(cycles):
+                task_state = {
+                    "run": run,
+                    "algo_type": algo_type,
+                    "simulation": simulation,
+                    "log": fout.getvalue(),
+                }
+                checkpoint(task_state, simulation.router_list)
+
+        if simulation.cycle_taken is not None:
+            if simulation.steady_state_stop:
+                str1 = "steady state stop cycle = %d\n" % simulation.cycle_taken
+            else:  # all routers has cleared their buffer
+                str1 = "ending cycle = %d\n" % simulation.cycle_taken
+            fout.write(str1)
+            print(str1, end="")
+
+        if simulation.steady_state is not None:
+            out_str = simulation.steady_state.report()
+            fout.write(out_str)
+            print(out_str, end="")
+
+        print("--- time taken: %s seconds ---" % (time.time() - start_time))  # time
+        print("--- Total packets sent: %s ---" % (generator.get_packet_sent_sum()))
+        # collect the statistics
+        stats_collection = sim_func.stats_collection
+        if profiler is not None:
+            stats_collection = profiler.timed(
+                "stats collection", "receivers", stats_collection
+            )
+        noc_heatmap = stats_collection(network, receiver_list, fout, args)
+        if profiler is not None:
+            print(profiler.table(), end="")
+        result = simulation.result()
+        simulation.close()
+
+    result["run"] = run
+    result["noc_heatmap"] = noc_heatmap
+    result["log"] = fout.getvalue()
+    result["console"] = console.getvalue()
+    return result
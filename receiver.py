@@ -1,12 +1,19 @@
 """
 Module: Receiver
 Desp:   Basic receiver with buffer for stats collection
-version: 0.0.2
+version: 0.0.8
 
 requirements: NIL
 
 Changelog:  0.0.1 - inital release
             0.0.2 - added more print stat functions
+            0.0.3 - heatmap_collection works with compact packets
+            0.0.4 - latency statistics kept as running aggregates, packets
+                    only kept when asked
+            0.0.5 - heatmap counted by the routers, heatmap_collection removed
+            0.0.6 - packets written to the packet trace if given
+            0.0.7 - reset to reuse the receiver for another simulation
+            0.0.8 - path trace of the packets not kept freed when stored
 """
 
 import numpy as np
@@ -17,6 +24,9 @@ class BaseReceiver:
         self.id = id
         self.number_of_packet_received = 0
 
+    def reset(self):
+        self.number_of_packet_received = 0
+
     def store(self, packet):
         self.number_of_packet_received += 1
 
@@ -30,38 +40,81 @@ class BaseReceiver:
 
 
 class PacketReceiver(BaseReceiver):
-    def __init__(self, id):
+    """
+    The latency statistics are running aggregates, memory does not grow with
+    the number of packets. The packets themselves are only kept in
+    local_storage if keep_packets, for the per packet lines. With a trace
+    writer they are written to the binary trace instead
+    """
+
+    HISTOGRAM_BIN_WIDTH = 8  # cycles per bin
+    HISTOGRAM_BINS = 128  # the last bin also counts the longer latencies
+
+    def __init__(self, id, keep_packets=True, trace=None):
         super().__init__(id)
+        self.keep_packets = keep_packets
+        self.reset(trace)
+
+    def reset(self, trace=None):
+        """ no packets received, the stats of the last run are new objects """
+        super().reset()
+        self.trace = trace  # PacketTraceWriter shared by the receivers
         self.local_storage = []
         self.average_clock_taken = None
+        self.latency_sum = 0  # python int, exact for the variance
+        self.latency_square_sum = 0
+        self.latency_min = None
+        self.latency_max = None
+        self.latency_histogram = np.zeros(self.HISTOGRAM_BINS, dtype=np.int64)
+        # per source, indexed by source id and grown to the largest id seen
+        self.source_count = np.zeros(0, dtype=np.int64)
+        self.source_latency_sum = np.zeros(0, dtype=np.int64)
+        self.source_order = []  # source id in the order first received
 
     def store(self, packet):
         super().store(packet)
-        self.local_storage.append(packet)
+        if self.keep_packets:
+            self.local_storage.append(packet)
+        if self.trace is not None:
+            self.trace.append(packet)
+        if not self.keep_packets:  # the path trace is not needed anymore
+            packet.free_trace()
+
+        latency = packet.clock_cycle_taken
+        self.latency_sum += latency
+        self.latency_square_sum += latency * latency
+        if self.latency_min is None or latency < self.latency_min:
+            self.latency_min = latency
+        if self.latency_max is None or latency > self.latency_max:
+            self.latency_max = latency
+        self.latency_histogram[
+            min(latency // self.HISTOGRAM_BIN_WIDTH, self.HISTOGRAM_BINS - 1)
+        ] += 1
+
+        source_id = packet.source_id
+        old_size = len(self.source_count)
+        if source_id >= old_size:
+            size = max(source_id + 1, 2 * old_size)
+            self.source_count = np.resize(self.source_count, size)
+            self.source_latency_sum = np.resize(self.source_latency_sum, size)
+            self.source_count[old_size:] = 0  # resize repeats the old values
+            self.source_latency_sum[old_size:] = 0
+        if self.source_count[source_id] == 0:
+            self.source_order.append(source_id)
+        self.source_count[source_id] += 1
+        self.source_latency_sum[source_id] += latency
 
     def is_empty(self):
-        return not self.local_storage
+        return self.number_of_packet_received == 0
 
     def print_stat(self, verbose, fout, print_output):
         super().print_stat(verbose, fout, print_output)
         self.print_packet_stat(verbose, fout, print_output)
 
     def print_packet_stat(self, verbose, fout, print_output):
-        clocks_taken = []
-        clock_taken_by_source = {}
-        if self.local_storage:
-            for pkt in self.local_storage:
-                # for average calculations
-                clocks_taken.append(pkt.clock_cycle_taken)
-                try:
-                    current_list = clock_taken_by_source[pkt.source_id]
-                    current_list.append(pkt.clock_cycle_taken)
-                    clock_taken_by_source.update({pkt.source_id: current_list})
-                except KeyError:
-                    clock_taken_by_source.update(
-                        {pkt.source_id: [pkt.clock_cycle_taken]}
-                    )
-                if verbose >= 2:
+        if self.number_of_packet_received > 0:
+            if verbose >= 2:
+                for pkt in self.local_storage:
                     pkt_string = "Pkt source: %2d, Dest: %s, clk:%4d, path:%s\n" % (
                         pkt.source_id,
                         str(pkt.dest_coordinates),
@@ -73,32 +126,19 @@ class PacketReceiver(BaseReceiver):
                         print(pkt_string, end="")
 
             if verbose >= 1:
-                avg_string = "avg pkt latency (cycles) = %.2f\n" % np.average(
-                    clocks_taken
+                avg_string = "avg pkt latency (cycles) = %.2f\n" % (
+                    self.latency_sum / self.number_of_packet_received
                 )
-                for source in clock_taken_by_source:
+                for source in self.source_order:
+                    count = int(self.source_count[source])
                     avg_string += (
                         "avg pkt latency from router %d = %.2f in %d packets\n"
                         % (
                             source,
-                            np.average(clock_taken_by_source[source]),
-                            len(clock_taken_by_source[source]),
+                            int(self.source_latency_sum[source]) / count,
+                            count,
                         )
                     )
                 if print_output:
                     print(avg_string, end="")
                 fout.write(avg_string)
-
-    def heatmap_collection(self):
-        heatmap = {}
-        if self.local_storage:
-            for pkt in self.local_storage:  # for every pkt
-                pkt.path_trace.pop(0)  # remove the source id
-                for router in pkt.path_trace:  # for every place it been to
-                    # increment heatmap
-                    try:
-                        current_val = heatmap[router]
-                        heatmap.update({router: (current_val + 1)})
-                    except KeyError:
-                        heatmap.update({router: 1})
-        return heatmap
\ No newline at end of file
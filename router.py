@@ -1,9 +1,9 @@
 """
 Module: BaseRouter
 Desp:   Basic XY 2d mesh router for baseline testing
-version: 0.2.4
+version: 0.3.0
 
-requirements: receiver.py
+requirements: receiver.py, fifo.py, routing_table.py, network_map.py
 
 Changelog:  0.0.1 - single buffer router (software)
             0.0.2 - 1 buffer per port and more functions
@@ -18,7 +18,14 @@ Changelog:  0.0.1 - single buffer router (software)
             0.2.2 - integrate the send_controller to simply top operation
             0.2.3 - bug fix, scheduler serving unconnected ports 
             0.2.4 - unlimited buffer for input local port
+            0.2.5 - PortFIFO buffers, O(1) remove for the long local port
+            0.2.6 - hooks for active set scheduling, idle routers are skipped
+            0.2.7 - count the packets entering for the heatmap
+            0.2.8 - X-Y direction from the shared routing table by dest id
+            0.2.9 - neighbours and input ports from the compiled topology
+            0.3.0 - reset to reuse the router for another simulation
 """
+from fifo import PortFIFO
 
 
 class BaseRouter:
@@ -33,27 +40,63 @@ class BaseRouter:
         self.coordinates = coordinates  # [y, x]
         self.neighbours_id = [id, None, None, None, None]
         self.neighbour_routers = [None, None, None, None, None]  # ignore local
-        self.buffer = [[], [], [], [], []]  # 5 buffers, 1 for each port
+        self.neighbour_input_port = [0, 0, 0, 0, 0]  # port of the neighbour
+        self.buffer_size = 4
+        # 5 buffers, 1 for each port
+        self.buffer = [PortFIFO(self.buffer_size) for port in range(5)]
         self.pkt_available_to_send_now = [False, False, False, False, False]
         self.pkt_sent = [False, False, False, False, False]  # for buffer_full
-        self.buffer_size = 4
         self.local_storage = rx_address
         self.current_serving_port = 0  # so first cycle will server port 0
+        self.active_set = None  # set by ActiveSet when used
+        self.idle = False  # not run by the active set from idle_since
+        self.idle_since = 0
+        self.routing_table = None  # set by set_routing_table
+        self.route_row = None  # next hop by dest id
 
     ### setup the router ###
 
-    def setup_router(self, neighbour_routers):
+    def setup_router(self, topology, router_list):
         """ use/overload this function to setup the router """
-        self.set_neighbour_routers(neighbour_routers)
+        self.set_neighbour_routers(topology, router_list)
         self.set_neighbours()
 
-    def set_neighbour_routers(self, neighbour_routers):
+    def set_neighbour_routers(self, topology, router_list):
         """ set the neighbour router in the respective port directions """
-        for router in neighbour_routers:
-            coordinates = router.coordinates
-            # use the old arbiter to decide the direction of the neighbour
-            direction = self.get_neighbour_direction(coordinates)
-            self.neighbour_routers[direction] = router
+        neighbours_id = topology.neighbours_id[self.id].tolist()
+        for port in range(1, 5):  # ignore local
+            if neighbours_id[port] >= 0:
+                self.neighbour_routers[port] = router_list[neighbours_id[port]]
+        self.neighbour_input_port = topology.reverse_port[self.id].tolist()
+
+    def set_routing_table(self, routing_table):
+        """ shared X-Y routing table of the mesh, the router keeps its row """
+        self.routing_table = routing_table
+        self.route_row = routing_table.row(self.id)
+
+    def __getstate__(self):
+        """ for copy and pickle, the route row is a view of the table """
+        state = self.__dict__.copy()
+        state["route_row"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.routing_table is not None:
+            self.route_row = self.routing_table.row(self.id)
+
+    def reset(self):
+        """
+        Func: back to the state before the first cycle, the buffers emptied.
+        The neighbours and routing table are kept, no need to set up again
+        """
+        for buffer in self.buffer:
+            buffer.clear()
+        self.pkt_available_to_send_now[:] = [False, False, False, False, False]
+        self.pkt_sent[:] = [False, False, False, False, False]
+        self.current_serving_port = 0
+        self.idle = False
+        self.idle_since = 0
 
     def set_neighbours(self):
         """
@@ -69,15 +112,21 @@ class BaseRouter:
     def packet_in(self, packet, port):
         """ store to input buffer """
         if port == 0:  # unlimited buffer for local port
+            if self.active_set is not None:
+                self.active_set.packet_injected(self)
             packet.update_packet(self.id, self.coordinates)
             self.buffer[port].append(packet)
             return True
         elif self.buffer_full(port):  # for other ports
             return False
         else:  # not full
+            if self.idle:  # wake up before the packet is seen
+                self.active_set.wake_up(self)
             # update packet information before storing
             packet.update_packet(self.id, self.coordinates)
             self.buffer[port].append(packet)
+            if self.active_set is not None:
+                self.active_set.traversal_count[self.id] += 1
             return True
 
     def packet_in_all(self, pkt_list):
@@ -89,6 +138,8 @@ class BaseRouter:
         """ store to local storage """
         packet.update_clock_cycle(current_clock_cycle)  # update cycle
         self.local_storage.store(packet)
+        if self.active_set is not None:
+            self.active_set.pkt_in_flight -= 1
 
     def buffer_packet_peek(self, port):
         """ retrive the output buffer data """
@@ -102,7 +153,7 @@ class BaseRouter:
         """ remove the output buffer data """
         if not self.buffer_empty(port):
             # remove the packet
-            self.buffer[port].pop(0)
+            self.buffer[port].popleft()
         else:
             raise BufferError("Trying to remove packet from empty buffer")
 
@@ -118,11 +169,12 @@ class BaseRouter:
 
     def buffer_full(self, port):
         """ for current cycle, like hardware FIFO status """
+        buffer = self.buffer[port]
         # no packet sent, but FIFO still full
-        if len(self.buffer[port]) >= self.buffer_size:
+        if buffer.full():
             return True
         # packet was sent, but hardware wise buffer still considered full
-        elif len(self.buffer[port]) == self.buffer_size - 1 and self.pkt_sent[port]:
+        elif len(buffer) == self.buffer_size - 1 and self.pkt_sent[port]:
             return True
         else:
             return False
@@ -143,7 +195,7 @@ class BaseRouter:
         if direction is not None:  # if there is packet
             # print("router",self.id, direction)  # debugging
             status = self.neighbour_routers[direction].receive_check(
-                packet, self.id
+                packet, self.neighbour_input_port[direction]
             )  # try sending
             if status is True:
                 # remove from sending router
@@ -156,7 +208,7 @@ class BaseRouter:
         direction = None
         if packet is not None:
             # check where the packet is going
-            direction = self.arbiter(packet.dest_coordinates)
+            direction = self.arbiter(packet.dest_id)
 
             # if packet has arrived
             if direction == 0:
@@ -172,9 +224,8 @@ class BaseRouter:
         self.buffer_packet_remove(self.current_serving_port)
         self.pkt_sent[self.current_serving_port] = True  # to indicate the pkt sent
 
-    def receive_check(self, packet, sender_id):
-        """ check the correct port buffer for incoming pkt """
-        port = self.neighbours_id.index(sender_id)
+    def receive_check(self, packet, port):
+        """ check the port buffer facing the sender for incoming pkt """
         return self.packet_in(packet, port)
 
     def prepare_next_cycle(self):
@@ -208,47 +259,35 @@ class BaseRouter:
         self.current_serving_port = next_port
         return next_port
 
-    def arbiter(self, dest_coordinates):
+    def arbiter(self, dest_id):
         """
         Func: To determine which direction to send the packet
-        Algo: X-Y algorithm
-        """
-        direction = None  # 0 self, 1 north, 2 east, 3 south, 4 west
-        x_diff = dest_coordinates[1] - self.coordinates[1]
-        y_diff = dest_coordinates[0] - self.coordinates[0]
-        if x_diff > 0:  # go east
-            direction = 2
-        elif x_diff < 0:  # go west
-            direction = 4
-        elif y_diff > 0:  # go south
-            direction = 3
-        elif y_diff < 0:  # go north
-            direction = 1
-        else:  # arrived
-            direction = 0
-        return direction
-
-    def get_neighbour_direction(self, dest_coordinates):
+        Algo: X-Y algorithm, looked up from the routing table
         """
-        Func: To determine which direction is the neighbour
-        """
-        direction = None  # 0 self, 1 north, 2 east, 3 south, 4 west
-        x_diff = dest_coordinates[1] - self.coordinates[1]
-        y_diff = dest_coordinates[0] - self.coordinates[0]
-        if x_diff > 0:  # go east
-            direction = 2
-        elif x_diff < 0:  # go west
-            direction = 4
-        elif y_diff > 0:  # go south
-            direction = 3
-        elif y_diff < 0:  # go north
-            direction = 1
-        else:  # arrived
-            direction = 0
-        return direction
+        return self.route_row[dest_id]  # 0 self, 1 north, 2 east, 3 south, 4 west
 
     ### external functions for simulator performance ###
 
+    def idle_cycle(self):
+        """ run 1 cycle with all buffers empty """
+        self.scheduler()
+        self.prepare_next_cycle()
+
+    def skip_idle_cycles(self, cycles):
+        """
+        For: active set scheduling
+        Func: catch up the cycles skipped while all buffers were empty.
+        Only the round robin pointer moves when the router is idle
+        """
+        if cycles > 0:
+            ports = [
+                port
+                for port, router_id in enumerate(self.neighbours_id)
+                if router_id is not None
+            ]
+            index = ports.index(self.current_serving_port)
+            self.current_serving_port = ports[(index + cycles) % len(ports)]
+
     def debug_empty_buffer(self):
         """ for debugging """
         for port in range(len(self.buffer)):
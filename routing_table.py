@@ -0,0 +1,90 @@
+"""
+Module: routing_table
+Desp:   X-Y next hop table shared by all the routers of a mesh
+version: 0.0.1
+
+requirements: numpy
+
+Changelog:  0.0.1 - initial release
+"""
+import functools
+import numpy as np
+
+SELF = 0  # same port encoding as BaseRouter
+NORTH = 1
+EAST = 2
+SOUTH = 3
+WEST = 4
+
+# direction by [sign of x diff + 1][sign of y diff + 1], x first
+XY_DIRECTION = np.array(
+    [[WEST, WEST, WEST], [NORTH, SELF, SOUTH], [EAST, EAST, EAST]], dtype=np.int8
+)
+
+
+class XYRoutingTable:
+    """
+    next_hop[router id, dest id] is the X-Y direction to send a packet, int8
+    of m*n x m*n built once for the mesh. The routers index their own row.
+    Above MAX_TABLE_SIZE entries the table is not built, the directions are
+    computed from the coordinates instead.
+    """
+
+    MAX_TABLE_SIZE = 2 ** 26  # 64 MB, up to a 90x90 mesh
+
+    def __init__(self, m, n):
+        self.m = m
+        self.n = n
+        number_of_routers = m * n
+        self.next_hop = None
+        if number_of_routers * number_of_routers <= self.MAX_TABLE_SIZE:
+            rows = np.arange(m)
+            cols = np.arange(n)
+            # sign of the differences, [source, dest]
+            y_sign = np.sign(rows[None, :] - rows[:, None]).astype(np.int8) + 1
+            x_sign = np.sign(cols[None, :] - cols[:, None]).astype(np.int8) + 1
+            next_hop = XY_DIRECTION[
+                x_sign[None, :, None, :], y_sign[:, None, :, None]
+            ]  # [source row, source col, dest row, dest col]
+            self.next_hop = next_hop.reshape(number_of_routers, number_of_routers)
+
+    def row(self, router_id):
+        """ next hop of the router by dest id, indexed like a list """
+        if self.next_hop is not None:
+            return memoryview(self.next_hop[router_id])  # no copy
+        return ArithmeticRouteRow(router_id, self.n)
+
+    def directions(self, routers, dest):
+        """ vectorized next hop for arrays of router and dest id """
+        if self.next_hop is not None:
+            return self.next_hop[routers, dest]
+        x_sign = np.sign(dest % self.n - routers % self.n) + 1
+        y_sign = np.sign(dest // self.n - routers // self.n) + 1
+        return XY_DIRECTION[x_sign, y_sign]
+
+
+class ArithmeticRouteRow:
+    """ row of the routing table computed on access, for the large meshes """
+
+    def __init__(self, router_id, n):
+        self.row, self.col = divmod(router_id, n)
+        self.n = n
+
+    def __getitem__(self, dest_id):
+        dest_row, dest_col = divmod(dest_id, self.n)
+        if dest_col > self.col:  # go east
+            return EAST
+        elif dest_col < self.col:  # go west
+            return WEST
+        elif dest_row > self.row:  # go south
+            return SOUTH
+        elif dest_row < self.row:  # go north
+            return NORTH
+        else:  # arrived
+            return SELF
+
+
+@functools.lru_cache(maxsize=1)
+def get_routing_table(m, n):
+    """ the table of the last mesh size, shared by the runs and the algos """
+    return XYRoutingTable(m, n)
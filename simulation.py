@@ -0,0 +1,333 @@
+"""
+Module: simulation
+Desp:   random pkt test of 1 algo as an object, the network built once and
+        reset in place for every run
+version: 0.1.5
+
+requirements:   options.py
+                sub_simulator_func.py
+                packet_generator.py
+
+Changelog:  0.0.1 - initial release
+            0.1.0 - the cycle loop of random pkt test, run_algo runs on it.
+                    Generator cache from random_pkt_test, profiler and
+                    packet trace by run index
+            0.1.1 - profiled injection and termination check picked once per
+                    step
+            0.1.2 - injection and termination check inline when not profiling
+            0.1.3 - load cycles of a spike trace kept out of the options, an
+                    explicit load_cycles used. Warning for a cycle limit
+                    below the trace
+            0.1.4 - 1 injection function, only wrapped by the profiler
+            0.1.5 - defaults from options.py, simulator.py not imported
+
+usage:  sim = Simulation(m=8, n=8, algo_type=2, target_rate=5, load_cycles=100)
+        for seed in range(1000):
+            sim.reset(seed)
+            result = sim.run()
+"""
+import copy
+import numpy as np
+
+import sub_simulator_func as sim_func
+
+from network_map import MeshTopology
+from options import get_parser
+from packet_generator import RandomGenerator
+from packet_generator import StreamGenerator
+from packet_generator import TraceGenerator
+from spike_trace import SpikeTrace
+from steady_state import BatchMeans
+
+# options of the simulator not supported, with the value they must keep
+FIXED_OPTIONS = {
+    "test_mode": 1,
+    "runs": 1,
+    "jobs": 1,
+    "profile": False,
+    "checkpoint_every": 0,
+    "resume": None,
+}
+
+
+class Simulation:
+    """
+    The options are the ones of the simulator, the defaults for the rest.
+    reset starts a run with the packets of its run seed, step runs cycles
+    and run goes to the end. The result record is the same as the one of
+    random_pkt_test.run_algo, without the text and with the heatmap always.
+    The same run seed gives the same result as the random pkt test, its run
+    seeds are from random_pkt_test.get_run_seeds. random_pkt_test runs its
+    tasks on it too, made by from_args
+    """
+
+    def __init__(self, **options):
+        self.args = get_parser().parse_args([])  # defaults
+        self.args.test_mode = 1
+        self.init_state()
+        self.set_options(**options)
+
+    @classmethod
+    def from_args(cls, args, topology=None):
+        """
+        Func: simulation with all the options of the simulator arguments, for
+        random_pkt_test. The options not supported by Simulation are not
+        checked, its caller handles them
+        """
+        simulation = cls.__new__(cls)
+        simulation.args = copy.copy(args)
+        simulation.init_state()
+        simulation.load_cycles = args.load_cycles
+        simulation.topology = topology
+        if topology is not None:
+            simulation.topology_key = (topology.m, topology.n)
+        simulation.build_network()
+        return simulation
+
+    def init_state(self):
+        self.topology = None
+        self.topology_key = None
+        self.network = None
+        self.network_key = None
+        self.generator = None  # no run until reset
+        self.trace = None
+        self.profiler = None
+        self.run_index = -1
+        self.load_cycles_given = False  # by an option, used over the trace
+
+    def set_options(self, **options):
+        """ the network is only built again for a new mesh, algo or engine """
+        args = copy.copy(self.args)  # kept as it was if an option is wrong
+        for name, value in options.items():
+            if not hasattr(args, name):
+                raise TypeError("unknown simulator option %s" % name)
+            setattr(args, name, value)
+        for name, value in FIXED_OPTIONS.items():
+            if getattr(args, name) != value:
+                raise ValueError("%s not supported by Simulation" % name)
+        if args.algo_type not in range(5):
+            raise ValueError("algo_type %d, Simulation runs 1 algo" % args.algo_type)
+        load_cycles_given = self.load_cycles_given or "load_cycles" in options
+        load_cycles = args.load_cycles
+        if args.spike_trace is not None:
+            cycle_count = SpikeTrace(args.spike_trace).cycle_count
+            if not load_cycles_given:  # injected up to the last spike
+                load_cycles = cycle_count
+            if args.cycle_limit < cycle_count:
+                print(
+                    "Warning: cycle limit %d below the %d cycles of the spike "
+                    "trace, only the spikes before it are replayed"
+                    % (args.cycle_limit, cycle_count)
+                )
+        self.args = args
+        self.load_cycles = load_cycles  # of the spike trace, args kept as given
+        self.load_cycles_given = load_cycles_given
+        self.build_network()
+
+    def build_network(self):
+        """ the network of the options, if not the one already built """
+        args = self.args
+        network_key = (
+            args.m,
+            args.n,
+            args.algo_type,
+            sim_func.use_vector_engine(args),
+            sim_func.keep_packets(args),
+            args.profile,
+        )
+        if network_key != self.network_key:
+            if self.topology_key != (args.m, args.n):
+                self.topology = MeshTopology(args.m, args.n)
+                self.topology_key = (args.m, args.n)
+            self.network, self.router_list, self.receiver_list = (
+                sim_func.create_network(args, self.topology)
+            )
+            self.network_key = network_key
+
+    def reset(self, seed=None, run=None, **options):
+        """
+        Func: start a new run with the packets of the run seed, a random one
+        if None. The options are changed first. run is the run index for the
+        packet trace name, the one after the last run if None
+        """
+        self.close()
+        if options:
+            self.set_options(**options)
+        args = self.args
+        if seed is None:
+            seed = np.random.randint(2 ** 31)
+        self.seed = seed
+        self.run_index = self.run_index + 1 if run is None else run
+
+        self.generator = get_generator(args, seed)
+        self.generator.soft_reset()
+        self.trace = sim_func.open_trace(args, self.run_index, args.algo_type)
+        sim_func.reset_network(self.network, self.receiver_list, self.trace)
+        self.profiler = self.network.profiler if args.profile else None
+        self.steady_state = None
+        if args.steady_state:
+            self.steady_state = BatchMeans(args.batch_cycles, args.ci_precision)
+        self.current_clock_cycle = 0  # next cycle to run
+        self.cycle_taken = None  # cycle the run ended, None at the cycle limit
+        self.steady_state_stop = False  # ended by the steady state, not drained
+        self.finished = False
+
+    def step(self, cycles=1):
+        """ Func: run up to this many cycles, return True once the run is over """
+        if self.generator is None:
+            raise RuntimeError("no run started, call reset first")
+        args = self.args
+        cycle_limit = args.cycle_limit
+        load_cycles = self.load_cycles
+        generator = self.generator
+        network = self.network
+        steady_state = self.steady_state
+        inject = self.inject
+        timed_in_flight = None
+        if self.profiler is not None:  # only bound when profiling
+            inject = self.profiler.timed("injection", type(generator).__name__, inject)
+            timed_in_flight = self.profiler.timed(
+                "termination check", "network", self.pkt_in_flight
+            )
+
+        for _ in range(cycles):
+            current_clock_cycle = self.current_clock_cycle
+            if self.finished or current_clock_cycle >= cycle_limit:
+                self.finished = True
+                break
+
+            if current_clock_cycle < load_cycles:
+                empty_flag = False  # prevent early termination
+            else:
+                empty_flag = True
+
+            """ set up the testing packets in each cycle """
+            if current_clock_cycle < load_cycles:  # no packets after
+                inject(current_clock_cycle)
+
+            """ This is to run the routers for 1 cycle to send out pkt """
+            # check if any packet left for early cycle termination
+            if timed_in_flight is None:
+                pkt_in_flight = network.pkt_in_flight
+            else:
+                pkt_in_flight = timed_in_flight()
+            if pkt_in_flight > 0:
+                empty_flag = False
+            network.run_cycle(current_clock_cycle)
+            self.current_clock_cycle = current_clock_cycle + 1
+
+            if empty_flag:  # all routers has cleared their buffer
+                self.cycle_taken = current_clock_cycle
+                self.finished = True
+            elif (
+                steady_state is not None
+                and current_clock_cycle < load_cycles
+                and steady_state.batch_due(current_clock_cycle)
+                and steady_state.add_batch(self.receiver_list)
+            ):
+                self.cycle_taken = current_clock_cycle
+                self.steady_state_stop = True
+                self.finished = True
+        if self.current_clock_cycle >= cycle_limit:
+            self.finished = True
+        return self.finished
+
+    def inject(self, current_clock_cycle):
+        """ the injection of a cycle of step, timed when profiling """
+        router_list = self.router_list
+        # each router have possibility to initiate packet
+        for router_id, pk_list in self.generator.get_cycle_packets(
+            current_clock_cycle
+        ):
+            router_list[router_id].packet_in_all(pk_list)
+
+    def pkt_in_flight(self):
+        """ the termination check of step, to be timed when profiling """
+        return self.network.pkt_in_flight
+
+    def run(self):
+        """ Func: run to the end, return the result record """
+        self.step(self.args.cycle_limit - self.current_clock_cycle)
+        result = self.result()
+        self.close()
+        return result
+
+    def result(self):
+        """ result record of the cycles run so far """
+        args = self.args
+        result = {
+            "run": self.run_index,
+            "algo_type": args.algo_type,
+            "seed": self.seed,
+            "cycle_taken": self.cycle_taken,
+            "packet_sent": self.generator.get_packet_sent_sum(),
+            "noc_heatmap": self.network.heatmap(args.m, args.n),
+        }
+        result.update(sim_func.latency_stats(self.receiver_list))
+        if self.steady_state is not None:
+            result.update(self.steady_state.stats())
+        return result
+
+    def close(self):
+        """ close the packet trace of the run, if any """
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+
+    def resumed(self):
+        """
+        Func: after loading from a checkpoint, the next runs with the same
+        run seed replay its generator
+        """
+        cache_generator(generator_key(self.args, self.seed), self.generator)
+
+
+def generator_key(args, run_seed):
+    return (
+        args.m,
+        args.n,
+        args.target_rate,
+        args.load_cycles,
+        run_seed,
+        args.stream_traffic,
+        args.spike_trace,
+        sim_func.record_traces(args),
+    )
+
+
+def get_generator(args, run_seed):
+    """
+    The workload is only records, the algos of a run replay the last
+    generator made in this process instead of generating it again
+    """
+    key = generator_key(args, run_seed)
+    if key not in generator_cache:
+        m, n = args.m, args.n
+        record_traces = sim_func.record_traces(args)
+        if args.spike_trace is not None:  # recorded spikes, read as replayed
+            generator = TraceGenerator(
+                m, n, args.spike_trace, record_traces=record_traces
+            )
+        else:
+            if args.stream_traffic:  # drawn cycle by cycle
+                generator_type = StreamGenerator
+            else:
+                generator_type = RandomGenerator
+            generator = generator_type(
+                m,
+                n,
+                rate=args.target_rate,
+                load_cycles=args.load_cycles,
+                seed=run_seed,
+                record_traces=record_traces,
+            )  # greater the rate, less likely packets are generated
+        cache_generator(key, generator)
+    return generator_cache[key]
+
+
+def cache_generator(key, generator):
+    generator_cache.clear()  # only keep 1 run
+    generator_cache[key] = generator
+
+
+generator_cache = {}
@@ -0,0 +1,153 @@
+"""
+Module: spike_trace
+Desp:   binary spike trace of an SNN workload, replayed by TraceGenerator
+version: 0.0.1
+
+requirements: numpy
+
+Changelog:  0.0.1 - initial release
+
+File:   header of HEADER_SIZE bytes, then the spike records in cycle order.
+        A record is the cycle, the source router and its dests, the dests
+        of all the records are router ids (int32) in <path>.dests, a record
+        has the offset and count of its dests in there.
+"""
+import numpy as np
+from array import array
+
+MAGIC = b"NOCSPIKE"
+VERSION = 1
+HEADER_SIZE = 64
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S8"),
+        ("version", "<u4"),
+        ("padding", "<u4"),
+        ("record_count", "<u8"),
+        ("dest_count", "<u8"),
+        ("cycle_count", "<u8"),  # last cycle + 1
+    ]
+)
+RECORD_DTYPE = np.dtype(
+    [
+        ("cycle", "<i8"),
+        ("source", "<i4"),
+        ("dest_count", "<i4"),
+        ("dest_offset", "<i8"),
+    ]
+)
+
+
+class SpikeTraceWriter:
+    """
+    Writes the spikes as they are appended, buffer_rows records at a time,
+    e.g. while converting a recorded spike train. The cycles can not go
+    back, a cycle can have any number of records.
+    """
+
+    def __init__(self, path, buffer_rows=65536):
+        self.path = path
+        self.dests_path = path + ".dests"
+        self.buffer_rows = buffer_rows
+        self.record_count = 0
+        self.dest_count = 0
+        self.last_cycle = -1
+        self.cycles = array("q")
+        self.sources = array("i")
+        self.counts = array("i")
+        self.offsets = array("q")
+        self.dests = array("i")
+        self.file = open(self.path, "wb")
+        self.file.write(bytes(HEADER_SIZE))  # filled in by close
+        self.dests_file = open(self.dests_path, "wb")
+
+    def append(self, cycle, source, dests):
+        """ spike of the source router at the cycle, to the dest routers """
+        if cycle < self.last_cycle:
+            raise ValueError(
+                "spike at cycle %d after cycle %d, the records must be in "
+                "cycle order" % (cycle, self.last_cycle)
+            )
+        self.last_cycle = cycle
+        self.cycles.append(cycle)
+        self.sources.append(source)
+        self.offsets.append(self.dest_count)
+        buffered_dests = len(self.dests)
+        self.dests.extend(dests)
+        dest_count = len(self.dests) - buffered_dests
+        self.counts.append(dest_count)
+        self.dest_count += dest_count
+        self.record_count += 1
+        if len(self.cycles) == self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        records = np.zeros(len(self.cycles), dtype=RECORD_DTYPE)
+        records["cycle"] = self.cycles
+        records["source"] = self.sources
+        records["dest_count"] = self.counts
+        records["dest_offset"] = self.offsets
+        self.file.write(records.tobytes())
+        self.dests_file.write(np.asarray(self.dests, dtype="<i4").tobytes())
+        for column in (self.cycles, self.sources, self.counts, self.offsets):
+            del column[:]
+        del self.dests[:]
+
+    def close(self):
+        self.flush()
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["version"] = VERSION
+        header["record_count"] = self.record_count
+        header["dest_count"] = self.dest_count
+        header["cycle_count"] = self.last_cycle + 1
+        self.file.seek(0)
+        self.file.write(header.tobytes())
+        self.file.close()
+        self.dests_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class SpikeTrace:
+    """
+    Reads a spike trace with memmap, trace.records are the records, nothing
+    is read until it is indexed. trace.dests(i) are the dests of record i
+    """
+
+    def __init__(self, path):
+        self.path = path
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header["magic"][0] != MAGIC:
+            raise ValueError("%s is not a closed spike trace" % path)
+        self.record_count = int(header["record_count"][0])
+        self.dest_count = int(header["dest_count"][0])
+        self.cycle_count = int(header["cycle_count"][0])
+        if self.record_count:
+            self.records = np.memmap(
+                path,
+                dtype=RECORD_DTYPE,
+                mode="r",
+                offset=HEADER_SIZE,
+                shape=(self.record_count,),
+            )
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+        if self.dest_count:
+            self.all_dests = np.memmap(
+                path + ".dests", dtype="<i4", mode="r", shape=(self.dest_count,)
+            )
+        else:
+            self.all_dests = np.zeros(0, dtype="<i4")
+
+    def __len__(self):
+        return self.record_count
+
+    def dests(self, index):
+        record = self.records[index]
+        offset = int(record["dest_offset"])
+        return self.all_dests[offset : offset + int(record["dest_count"])]
@@ -0,0 +1,179 @@
+"""
+Module: steady_state
+Desp:   warm-up detection and batch means stopping rule for random pkt test
+version: 0.0.2
+
+requirements: numpy
+
+Changelog:  0.0.1 - initial release
+            0.0.2 - infinite t quantile and interval below 2 values
+"""
+import math
+import numpy as np
+
+# 97.5% quantiles of the t distribution by degrees of freedom, 95% intervals
+T_QUANTILES = {
+    1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365,
+    8: 2.306, 9: 2.262, 10: 2.228, 11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145,
+    15: 2.131, 16: 2.120, 17: 2.110, 18: 2.101, 19: 2.093, 20: 2.086,
+    21: 2.080, 22: 2.074, 23: 2.069, 24: 2.064, 25: 2.060, 26: 2.056,
+    27: 2.052, 28: 2.048, 29: 2.045, 30: 2.042, 40: 2.021, 60: 2.000,
+    120: 1.980,
+}
+
+
+def t_quantile(degrees_of_freedom):
+    """
+    the entry at or below, a bit wider than the exact one between. Infinite
+    below 1 degree of freedom, 1 value gives no interval
+    """
+    if degrees_of_freedom < 1:
+        return math.inf
+    if degrees_of_freedom > 120:
+        return 1.960
+    while degrees_of_freedom not in T_QUANTILES:
+        degrees_of_freedom -= 1
+    return T_QUANTILES[degrees_of_freedom]
+
+
+def mser_truncation(series):
+    """
+    Func: warm-up length by MSER, the number of first values to drop so the
+    rest has the smallest standard error of its mean. Only the first half
+    is searched
+    """
+    values = np.asarray(series, dtype=np.float64)
+    number_of_values = len(values)
+    # sums of the values kept, for every number dropped
+    tail_sum = np.cumsum(values[::-1])[::-1]
+    tail_square_sum = np.cumsum((values * values)[::-1])[::-1]
+    dropped = np.arange(number_of_values // 2 + 1)
+    kept = number_of_values - dropped
+    mean = tail_sum[dropped] / kept
+    square_error = tail_square_sum[dropped] - kept * mean * mean
+    return int(np.argmin(square_error / (kept * kept)))
+
+
+def confidence_interval(series):
+    """ mean and 95% half width, the values are taken as independent """
+    values = np.asarray(series, dtype=np.float64)
+    number_of_values = len(values)
+    mean = values.mean()
+    if number_of_values < 2:  # no spread to measure
+        return mean, math.inf
+    half_width = (
+        t_quantile(number_of_values - 1)
+        * values.std(ddof=1)
+        / math.sqrt(number_of_values)
+    )
+    return mean, half_width
+
+
+class BatchMeans:
+    """
+    The packets received and their latency sum are read from the receivers
+    every batch_cycles cycles, giving the mean latency and the throughput of
+    the batch. The warm-up batches are cut by MSER on both series, the run can
+    stop once the confidence intervals of the batches left are within
+    precision of their means. A saturated network never settles, its latency
+    keeps growing and the run does not stop.
+    """
+
+    MIN_BATCHES = 10  # after the warm-up, before the intervals are trusted
+
+    def __init__(self, batch_cycles, precision):
+        self.batch_cycles = batch_cycles
+        self.precision = precision
+        self.latency = []  # mean latency of the packets received in the batch
+        self.throughput = []  # packets received per cycle in the batch
+        self.packet_received = 0  # totals at the end of the last batch
+        self.latency_sum = 0
+        self.warmup_batches = 0
+        self.converged = False
+
+    def batch_due(self, current_clock_cycle):
+        return (current_clock_cycle + 1) % self.batch_cycles == 0
+
+    def add_batch(self, receiver_list):
+        """ Func: close the batch, return True when the run can stop """
+        packet_received = 0
+        latency_sum = 0
+        for receiver in receiver_list:
+            packet_received += receiver.number_of_packet_received
+            latency_sum += receiver.latency_sum
+        count = packet_received - self.packet_received
+        self.throughput.append(count / self.batch_cycles)
+        if count:
+            self.latency.append((latency_sum - self.latency_sum) / count)
+        else:  # nothing arrived yet, still warming up
+            self.latency.append(0.0)
+        self.packet_received = packet_received
+        self.latency_sum = latency_sum
+
+        number_of_batches = len(self.latency)
+        self.warmup_batches = max(
+            mser_truncation(self.latency), mser_truncation(self.throughput)
+        )
+        if number_of_batches - self.warmup_batches < self.MIN_BATCHES:
+            return False
+        if self.warmup_batches == number_of_batches // 2:
+            return False  # cut at the end of the search, still drifting
+        self.converged = self.settled(self.latency) and self.settled(self.throughput)
+        return self.converged
+
+    def settled(self, series):
+        """
+        the interval of the batches after the warm-up is within precision, and
+        the means of their two halves differ by less than 2 half widths. A
+        slow drift can pass the interval but not the halves
+        """
+        kept = series[self.warmup_batches :]
+        mean, half_width = confidence_interval(kept)
+        if half_width > self.precision * abs(mean):
+            return False
+        middle = len(kept) // 2
+        drift = abs(np.mean(kept[:middle]) - np.mean(kept[middle:]))
+        return drift <= 2 * half_width
+
+    def stats(self):
+        """ the steady state values for the result records """
+        stats = {
+            "steady_state": self.converged,
+            "warmup_cycles": self.warmup_batches * self.batch_cycles,
+        }
+        if len(self.latency) - self.warmup_batches >= 2:
+            for name, series in (
+                ("latency", self.latency),
+                ("throughput", self.throughput),
+            ):
+                mean, half_width = confidence_interval(
+                    series[self.warmup_batches :]
+                )
+                stats["steady_%s" % name] = float(mean)
+                stats["steady_%s_ci" % name] = float(half_width)
+        return stats
+
+    def report(self):
+        """ text for sim_data.txt """
+        stats = self.stats()
+        number_of_batches = len(self.latency) - self.warmup_batches
+        if stats["steady_state"]:
+            out_str = "steady state after warm-up = %d cycles, %d batches\n" % (
+                stats["warmup_cycles"],
+                number_of_batches,
+            )
+        else:
+            out_str = "steady state not reached, warm-up = %d cycles, %d batches\n" % (
+                stats["warmup_cycles"],
+                number_of_batches,
+            )
+        if "steady_latency" in stats:
+            out_str += "steady pkt latency (cycles) = %.2f +- %.2f\n" % (
+                stats["steady_latency"],
+                stats["steady_latency_ci"],
+            )
+            out_str += "steady throughput (pkt/cycle) = %.4f +- %.4f\n" % (
+                stats["steady_throughput"],
+                stats["steady_throughput_ci"],
+            )
+        return out_str
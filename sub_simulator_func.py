@@ -1,10 +1,12 @@
 """
 This contains some common functions used by sub simulators
 """
+import collections
+import math
+import os
 import numpy as np
 
 from network_map import coordinates_2_id
-from network_map import coordinates_2_id_list
 from network_map import id_2_coordinates
 
 from receiver import PacketReceiver as rx
@@ -14,9 +16,22 @@ from elra_router import ELRARouter
 from ca_router import CARouter
 from a_router import ARouter
 from modxy_router import modXYRouter
+from vector_engine import VectorXYEngine
+from active_set import ActiveSet
+from profiler import ProfiledActiveSet
+from profiler import ProfiledVectorXYEngine
+from routing_table import get_routing_table
+from packet_trace import PacketTrace
+from packet_trace import PacketTraceWriter
 
+# packet read back from a spilled trace, with what the per packet lines print
+SpilledPacket = collections.namedtuple(
+    "SpilledPacket",
+    ["source_id", "dest_coordinates", "clock_cycle_taken", "path_trace"],
+)
 
-def create_router_list(args, noc_map, noc_map_nodes):
+
+def create_router_list(args, topology, trace=None):
     m, n = args.m, args.n
     algo_type = args.algo_type
     number_of_routers = m * n
@@ -26,13 +41,11 @@ def create_router_list(args, noc_map, noc_map_nodes):
     # create the routers and map them
     for router_id in range(number_of_routers):
         # receiver to store the packets from routers
-        rx_address = rx(router_id)
+        rx_address = rx(router_id, keep_packets=keep_packets(args), trace=trace)
         receiver_list.append(rx_address)
 
         # get the parameters
-        coordinates = noc_map_nodes[router_id]
-        neighbours_coordinates = list(noc_map.adj[coordinates])
-        neighbours_id = coordinates_2_id_list(neighbours_coordinates, m, n)
+        coordinates = topology.coordinates(router_id)
         # create the router based on algo
         if algo_type == 4:
             router_list.append(CARouter(router_id, coordinates, rx_address))
@@ -46,24 +59,115 @@ def create_router_list(args, noc_map, noc_map_nodes):
             router_list.append(Router(router_id, coordinates, rx_address))
 
     # This can only be done after all the routers are initiated
-    for router_id in range(number_of_routers):
-        # get the parameters
-        coordinates = noc_map_nodes[router_id]
-        neighbours_coordinates = list(noc_map.adj[coordinates])
-        neighbours_id = coordinates_2_id_list(neighbours_coordinates, m, n)
-        neighbour_routers = [
-            router_list[neighbour_id] for neighbour_id in neighbours_id
-        ]
-        router_list[router_id].setup_router(neighbour_routers)
+    routing_table = get_routing_table(m, n)
+    for router in router_list:
+        router.setup_router(topology, router_list)
+        router.set_routing_table(routing_table)
 
     return router_list, receiver_list
 
 
-def stats_collection(receiver_list, fout, args):
+def create_network(args, topology, trace=None):
+    """
+    Func: create the network to run every cycle, with its router and receiver
+    lists. Both network types have run_cycle and pkt_in_flight. With
+    --profile they are the profiled subclasses, with a profiler attribute.
+    The receivers write the packets to the trace if given
+    """
+    if use_vector_engine(args):
+        network, receiver_list = create_vector_engine(args, topology, trace)
+        router_list = network.routers
+    else:
+        router_list, receiver_list = create_router_list(args, topology, trace)
+        if args.profile:
+            network = ProfiledActiveSet(router_list)
+        else:
+            network = ActiveSet(router_list)
+    return network, router_list, receiver_list
+
+
+def reset_network(network, receiver_list, trace=None):
+    """
+    Func: the network of create_network back to its state before the first
+    cycle, to reuse it instead of creating it again. The receivers write
+    the packets to the new trace if given
+    """
+    for receiver in receiver_list:
+        receiver.reset(trace)
+    network.reset()
+
+
+def use_vector_engine(args):
+    """ the vectorized engine only has the basic XY router """
+    return args.vectorized and args.algo_type == 0
+
+
+def create_vector_engine(args, topology, trace=None):
+    m, n = args.m, args.n
+    receiver_list = [
+        rx(router_id, keep_packets=keep_packets(args), trace=trace)
+        for router_id in range(m * n)
+    ]
+    if args.profile:
+        engine = ProfiledVectorXYEngine(topology, receiver_list)
+    else:
+        engine = VectorXYEngine(topology, receiver_list)
+    return engine, receiver_list
+
+
+def checkpoint_due(args, current_clock_cycle):
+    """ save after every checkpoint_every cycles, 0 for no checkpoints """
+    checkpoint_every = args.checkpoint_every
+    return checkpoint_every > 0 and (current_clock_cycle + 1) % checkpoint_every == 0
+
+
+def keep_packets(args):
+    """ the packets are only needed for the per packet lines """
+    return args.verbose >= 2 and args.trace_path is None and not spill_packets(args)
+
+
+def spill_packets(args):
+    """
+    with checkpoints the packets for the per packet lines go to a trace next
+    to the checkpoint, which only saves its size
+    """
+    return args.verbose >= 2 and args.trace_path is None and args.checkpoint_every > 0
+
+
+def record_traces(args):
+    """ the path traces are only needed for the per packet lines or the trace """
+    return args.verbose >= 2 or args.trace_path is not None
+
+
+def open_trace(args, run, algo_type):
+    """
+    Func: packet trace writer of 1 algo of 1 run, None without --trace_path.
+    Every algo and run has its own file, named after the trace path. The
+    packets spilled for the checkpoints share 1 file, read back before the
+    next algo or run
+    """
+    if args.trace_path is None:
+        if spill_packets(args):
+            return PacketTraceWriter(args.checkpoint_path + ".packets")
+        return None
+    root, ext = os.path.splitext(args.trace_path)
+    return PacketTraceWriter("%s_run%d_algo%d%s" % (root, run, algo_type, ext))
+
+
+def close_trace(receiver_list):
+    """ the receivers share the writer """
+    trace = receiver_list[0].trace
+    if trace is not None:
+        trace.close()
+
+
+def stats_collection(network, receiver_list, fout, args):
     m, n = args.m, args.n
     verbose = args.verbose
     print_output = args.print_output
     noc_heatmap = None
+    if spill_packets(args):
+        load_spilled_packets(receiver_list, n)
     total_pkt_count(receiver_list, fout)
 
     # for rest of the stats
@@ -71,38 +175,127 @@ def stats_collection(receiver_list, fout, args):
         receiver.print_stat(verbose, fout, print_output)
 
     if verbose == 3:
-        noc_heatmap = heatmap_save(receiver_list, m, n)
+        noc_heatmap = heatmap_save(network, m, n)
 
     return noc_heatmap
 
 
-def summary(packet_sent, cycle_taken, fsum):
+def load_spilled_packets(receiver_list, n):
+    """ the packets of the spilled trace back in the receivers, in order """
+    writer = receiver_list[0].trace
+    writer.close()
+    trace = PacketTrace(writer.path)
+    for receiver in receiver_list:
+        receiver.local_storage = []
+    for chunk_index in range(len(trace.chunks)):
+        chunk = trace.chunk(chunk_index)
+        for source, dest, latency, hops, path_offset in zip(
+            chunk["source"].tolist(),
+            chunk["dest"].tolist(),
+            chunk["latency"].tolist(),
+            chunk["hops"].tolist(),
+            chunk["path_offset"].tolist(),
+        ):
+            receiver_list[dest].local_storage.append(
+                SpilledPacket(
+                    source,
+                    divmod(dest, n),
+                    latency,
+                    trace.paths[path_offset : path_offset + hops + 1].tolist(),
+                )
+            )
+
+
+def summary(packet_sent, cycle_taken, fsum, steady_throughput=None):
+    """
+    throughput of the whole runs, and the steady state throughput when it is
+    measured, None for the runs too short to have it. The results are by run
+    then by algo type, cycle_taken None for the runs stopped by the cycle
+    limit, left out of the average throughput
+    """
     summary_str = ""
     number_of_runs = len(cycle_taken)
-    number_of_algo_type = len(cycle_taken[0])  # always have at least 1 run
+    algo_type_list = sorted(set().union(*cycle_taken))
     # loop through the algo_type
-    for algo_type in range(number_of_algo_type):
+    for algo_type in algo_type_list:
+        runs = [run for run in range(number_of_runs) if algo_type in cycle_taken[run]]
         throughput = []
         algo_cycles = []
         algo_packets = []
         # then the runs
-        for run in range(number_of_runs):
+        for run in runs:
             run_packet = packet_sent[run][algo_type]
             run_cycle = cycle_taken[run][algo_type]
             algo_packets.append(run_packet)
             algo_cycles.append(run_cycle)
-            throughput.append(run_packet / run_cycle)
+            if run_cycle is not None:
+                throughput.append(run_packet / run_cycle)
 
-        avg_throughput = np.average(throughput)
         summary_str += "******Algo %d summary*******\n" % algo_type
         summary_str += "cycle_taken=%s\n" % str(algo_cycles)
         summary_str += "pkt sent=%s\n" % str(algo_packets)
-        summary_str += "average throughput = %f\n" % avg_throughput
+        if throughput:
+            summary_str += "average throughput = %f\n" % np.average(throughput)
+        undrained = len(runs) - len(throughput)
+        if undrained:
+            summary_str += "%d run(s) stopped by the cycle limit, not averaged\n" % (
+                undrained
+            )
+        if steady_throughput is not None:
+            algo_steady = [steady_throughput[run][algo_type] for run in runs]
+            summary_str += "steady throughput=%s\n" % str(algo_steady)
+            measured = [value for value in algo_steady if value is not None]
+            if measured:
+                summary_str += "average steady throughput = %f\n" % np.average(
+                    measured
+                )
 
     fsum.write(summary_str)
     print(summary_str)
 
 
+def latency_stats(receiver_list):
+    """ latency statistics of all the received packets, for result records """
+    count = 0
+    latency_sum = 0
+    latency_square_sum = 0
+    latency_min = []
+    latency_max = []
+    histogram = np.zeros(rx.HISTOGRAM_BINS, dtype=np.int64)
+    for receiver in receiver_list:
+        if receiver.number_of_packet_received > 0:
+            count += receiver.number_of_packet_received
+            latency_sum += receiver.latency_sum
+            latency_square_sum += receiver.latency_square_sum
+            latency_min.append(receiver.latency_min)
+            latency_max.append(receiver.latency_max)
+            histogram += receiver.latency_histogram
+    stats = {
+        "packet_received": count,
+        "latency_sum": latency_sum,  # to pool the runs
+        "latency_square_sum": latency_square_sum,
+        "latency_histogram": histogram,
+    }
+    stats["latency_avg"], stats["latency_std"] = latency_avg_std(
+        count, latency_sum, latency_square_sum
+    )
+    if count:
+        stats["latency_min"] = min(latency_min)
+        stats["latency_max"] = max(latency_max)
+    else:  # nothing received
+        stats["latency_min"] = stats["latency_max"] = None
+    return stats
+
+
+def latency_avg_std(count, latency_sum, latency_square_sum):
+    """ average and standard deviation from the sums, None for no packets """
+    if not count:
+        return None, None
+    # all integers until the square root
+    variance = count * latency_square_sum - latency_sum * latency_sum
+    return latency_sum / count, math.sqrt(variance) / count
+
+
 def total_pkt_count(receiver_list, fout):
     count = 0
     for receiver in receiver_list:
@@ -112,16 +305,21 @@ def total_pkt_count(receiver_list, fout):
     print(string, end="")
 
 
-def heatmap_save(receiver_list, m, n):
-    # heatmap save from the stats in receivers
-    number_of_routers = m * n
-    noc_heatmap = np.zeros(number_of_routers, dtype=int)
-    for receiver in receiver_list:
-        router_heatmap = receiver.heatmap_collection()
-        # add the counts to the overall heatmap
-        # if router_heatmap is not None:
-        for router in router_heatmap:
-            noc_heatmap[router] += router_heatmap[router]
+def heatmap_save(network, m, n):
+    # heatmap from the traversal count of the routers, kept by the network
+    return network.heatmap(m, n)
 
-    noc_heatmap = np.reshape(noc_heatmap, (m, n))
-    return noc_heatmap
+
+def heatmap_output(noc_heatmap_list, algo_type, heatmap_path=None):
+    """
+    Func: show the heatmaps, or with a heatmap path render them to the file
+    in a worker process. heatmap imports matplotlib, only done here
+    """
+    import heatmap
+
+    if heatmap_path is not None:
+        heatmap.heatmap_render_process(noc_heatmap_list, algo_type, heatmap_path)
+    elif len(noc_heatmap_list) == 1:
+        heatmap.heatmap_display(noc_heatmap_list[0], algo_type)
+    else:
+        heatmap.heatmap_multiple_display(noc_heatmap_list)
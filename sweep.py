@@ -0,0 +1,271 @@
+"""
+Module: sweep
+Desp:   parameter sweep of the random pkt test over mesh size, algo and rate
+version: 0.0.4
+
+requirements:   options.py
+                simulation.py
+
+Changelog:  0.0.1 - initial release
+            0.0.2 - points run on a Simulation kept by the worker, the
+                    network reset instead of built for every run
+            0.0.3 - latency_std of all the packets of the point, pooled
+                    from the sums of the runs
+            0.0.4 - str2bool from options.py
+
+usage:  python3 sweep.py --m 4 8 --n 4 8 --algo_type 5 --target_rate 2 5 10
+        one row per point in the results csv, points already in the csv are
+        skipped so an interrupted sweep continues where it stopped
+"""
+import argparse
+import csv
+import itertools
+import os
+import time
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import random_pkt_test as RPT
+import sub_simulator_func as sim_func
+
+from options import str2bool
+from simulation import Simulation
+
+POINT_FIELDS = [
+    "m",
+    "n",
+    "algo_type",
+    "target_rate",
+    "load_cycles",
+    "runs",
+    "cycle_limit",
+    "seed",
+]
+POINT_TYPES = [int, int, int, float, int, int, int, int]
+RESULT_FIELDS = [
+    "cycles_taken",
+    "drained_runs",
+    "packet_sent",
+    "packet_received",
+    "throughput",
+    "latency_avg",
+    "latency_std",
+    "latency_min",
+    "latency_max",
+    "time_taken",
+]
+
+
+def grid_points(args):
+    """ every combination of the parameter lists, algo 5 is all the routers """
+    algo_type_list = []
+    for algo_type in args.algo_type:
+        algo_type_list += [0, 1, 2, 3, 4] if algo_type == 5 else [algo_type]
+    points = []
+    for m, n, algo_type, target_rate, load_cycles, runs in itertools.product(
+        args.m, args.n, algo_type_list, args.target_rate, args.load_cycles, args.runs
+    ):
+        points.append(
+            make_point(
+                m, n, algo_type, target_rate, load_cycles, runs,
+                args.cycle_limit, args.seed,
+            )
+        )
+    return points
+
+
+def read_points(path, args):
+    """ list of points from a csv, cycle_limit and seed default to the options """
+    points = []
+    with open(path, newline="") as fin:
+        for row in csv.DictReader(fin):
+            row.setdefault("cycle_limit", args.cycle_limit)
+            row.setdefault("seed", args.seed)
+            points.append(make_point(*[row[field] for field in POINT_FIELDS]))
+    return points
+
+
+def make_point(*values):
+    """ the point as a tuple in the order of POINT_FIELDS, also the resume key """
+    return tuple(
+        field_type(value) for field_type, value in zip(POINT_TYPES, values)
+    )
+
+
+def read_done_points(path):
+    """ points that already have results """
+    done = set()
+    if os.path.exists(path):
+        with open(path, newline="") as fin:
+            for row in csv.DictReader(fin):
+                done.add(make_point(*[row[field] for field in POINT_FIELDS]))
+    return done
+
+
+def run_point(point, vectorized):
+    """
+    Func: simulate 1 point, can run in a worker process. The runs are the
+    same as the random pkt test ones. Return the row for the results table
+    """
+    options = dict(zip(POINT_FIELDS, point))
+    number_of_runs = options.pop("runs")
+    seed = options.pop("seed")
+    options["verbose"] = 0
+    options["vectorized"] = vectorized
+
+    start_time = time.time()
+    if simulation_cache:  # the network is built again only if it changes
+        simulation = simulation_cache[0]
+        simulation.set_options(**options)
+    else:
+        simulation = Simulation(**options)
+        simulation_cache.append(simulation)
+    results = []
+    for run_seed in RPT.get_run_seeds(seed, number_of_runs):
+        simulation.reset(run_seed)
+        results.append(simulation.run())
+    time_taken = time.time() - start_time
+
+    # runs that hit the cycle limit are counted as taking the whole limit
+    cycle_limit = options["cycle_limit"]
+    cycles = [
+        cycle_limit if result["cycle_taken"] is None else result["cycle_taken"]
+        for result in results
+    ]
+    packet_sent = [result["packet_sent"] for result in results]
+    packet_received = [result["packet_received"] for result in results]
+    latency_min = [
+        result["latency_min"] for result in results if result["packet_received"]
+    ]
+    latency_max = [
+        result["latency_max"] for result in results if result["packet_received"]
+    ]
+
+    row = dict(zip(POINT_FIELDS, point))
+    row["cycles_taken"] = np.average(cycles)
+    row["drained_runs"] = sum(result["cycle_taken"] is not None for result in results)
+    row["packet_sent"] = np.average(packet_sent)
+    row["packet_received"] = np.average(packet_received)
+    row["throughput"] = np.average(np.divide(packet_sent, cycles))
+    # latency of all the packets received in the runs, pooled from the sums
+    row["latency_avg"], row["latency_std"] = sim_func.latency_avg_std(
+        sum(packet_received),
+        sum(result["latency_sum"] for result in results),
+        sum(result["latency_square_sum"] for result in results),
+    )
+    if latency_min:
+        row["latency_min"] = min(latency_min)
+        row["latency_max"] = max(latency_max)
+    else:
+        row["latency_min"] = row["latency_max"] = None
+    row["time_taken"] = time_taken
+    return row
+
+
+simulation_cache = []  # Simulation of the last point run in this process
+
+
+def main(args):
+    if args.points is not None:
+        points = read_points(args.points, args)
+    else:
+        points = grid_points(args)
+
+    done = read_done_points(args.results)
+    pending = [point for point in points if point not in done]
+    print(
+        "%d points, %d done, %d to run"
+        % (len(points), len(points) - len(pending), len(pending))
+    )
+    if not pending:
+        return
+
+    new_file = not os.path.exists(args.results)
+    with open(args.results, "a", newline="") as fres:
+        writer = csv.DictWriter(fres, fieldnames=POINT_FIELDS + RESULT_FIELDS)
+        if new_file:
+            writer.writeheader()
+
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            futures = [
+                executor.submit(run_point, point, args.vectorized)
+                for point in pending
+            ]
+            for count, future in enumerate(as_completed(futures), 1):
+                row = future.result()
+                writer.writerow(row)
+                fres.flush()  # keep the finished points if interrupted
+                print(
+                    "[%d/%d] m=%d n=%d algo=%d rate=%g: throughput=%.4f"
+                    % (
+                        count,
+                        len(pending),
+                        row["m"],
+                        row["n"],
+                        row["algo_type"],
+                        row["target_rate"],
+                        row["throughput"],
+                    )
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="noc simulator parameter sweep",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument("--m", type=int, nargs="+", default=[4], help="rows")
+    parser.add_argument("--n", type=int, nargs="+", default=[4], help="columns")
+    parser.add_argument(
+        "--algo_type",
+        type=int,
+        nargs="+",
+        default=[5],
+        help="router types, 5 for all routers",
+    )
+    parser.add_argument(
+        "--target_rate",
+        type=float,
+        nargs="+",
+        default=[5],
+        help="probability of sending spikes, low 0-10 high",
+    )
+    parser.add_argument(
+        "--load_cycles", type=int, nargs="+", default=[20], help="cycles to inject"
+    )
+    parser.add_argument(
+        "--runs", type=int, nargs="+", default=[1], help="number of runs per point"
+    )
+    parser.add_argument("--cycle_limit", type=int, default="1000", help="cycles limit")
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default="0",
+        help="seed for every point, same traffic for all algos",
+    )
+    parser.add_argument(
+        "--points",
+        type=str,
+        default=None,
+        help="""csv with a list of points instead of the grid, columns
+        m,n,algo_type,target_rate,load_cycles,runs[,cycle_limit,seed]""",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=os.cpu_count(), help="number of worker processes"
+    )
+    parser.add_argument(
+        "--vectorized",
+        type=str2bool,
+        default=False,
+        help="Run basic XY (algo 0) on the vectorized numpy engine",
+    )
+    parser.add_argument(
+        "--results",
+        type=str,
+        default="./sweep_results.csv",
+        help="csv to store the results, also used to resume",
+    )
+    args = parser.parse_args()
+
+    main(args)
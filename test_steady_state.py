@@ -0,0 +1,55 @@
+"""
+tests for steady_state.py
+
+usage: python3 -m unittest test_steady_state
+"""
+import math
+import unittest
+
+from steady_state import BatchMeans, confidence_interval, t_quantile
+
+
+class TQuantileTest(unittest.TestCase):
+    def test_table_entries(self):
+        self.assertEqual(t_quantile(1), 12.706)
+        self.assertEqual(t_quantile(30), 2.042)
+        self.assertEqual(t_quantile(500), 1.960)
+
+    def test_between_entries_uses_the_one_below(self):
+        self.assertEqual(t_quantile(35), t_quantile(30))
+
+    def test_no_degrees_of_freedom(self):
+        self.assertEqual(t_quantile(0), math.inf)
+        self.assertEqual(t_quantile(-1), math.inf)
+
+
+class ConfidenceIntervalTest(unittest.TestCase):
+    def test_single_value(self):
+        mean, half_width = confidence_interval([3.0])
+        self.assertEqual(mean, 3.0)
+        self.assertEqual(half_width, math.inf)
+
+    def test_two_values(self):
+        mean, half_width = confidence_interval([1.0, 3.0])
+        self.assertEqual(mean, 2.0)
+        self.assertAlmostEqual(half_width, 12.706)  # std sqrt(2) over sqrt(2)
+
+
+class FakeReceiver:
+    def __init__(self, number_of_packet_received, latency_sum):
+        self.number_of_packet_received = number_of_packet_received
+        self.latency_sum = latency_sum
+
+
+class BatchMeansTest(unittest.TestCase):
+    def test_stats_after_one_batch(self):
+        batch_means = BatchMeans(batch_cycles=10, precision=0.05)
+        self.assertFalse(batch_means.add_batch([FakeReceiver(5, 50)]))
+        stats = batch_means.stats()
+        self.assertFalse(stats["steady_state"])
+        self.assertNotIn("steady_latency", stats)
+        batch_means.report()
+
+
+if __name__ == "__main__":
+    unittest.main()
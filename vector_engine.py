@@ -0,0 +1,321 @@
+"""
+Module: vector_engine
+Desp:   Vectorized cycle engine for the basic XY 2d mesh, same behaviour as
+        BaseRouter but the whole mesh is stepped with numpy array operations
+version: 0.0.9
+
+requirements: numpy, receiver.py, routing_table.py, network_map.py
+
+Changelog:  0.0.1 - initial release
+            0.0.2 - run_cycle and packet in flight count, same as ActiveSet
+            0.0.3 - destination id from the compact packets
+            0.0.4 - traversal count of the routers for the heatmap
+            0.0.5 - directions from the shared routing table
+            0.0.6 - neighbours and reverse ports from the compiled topology
+            0.0.7 - reset of the router states and packets
+            0.0.8 - packet index of the delivered packets reused, memory
+                    grows with the packets in flight only
+            0.0.9 - local queues linked in a pool by packet index instead of
+                    a dense router x queue length matrix, injection of a
+                    packet list with numpy, path traces only filled when
+                    recorded
+"""
+import numpy as np
+
+from routing_table import get_routing_table
+
+
+class VectorXYEngine:
+    SELF = 0  # same port encoding as BaseRouter
+    NORTH = 1
+    EAST = 2
+    SOUTH = 3
+    WEST = 4
+
+    def __init__(self, topology, receiver_list, buffer_size=4):
+        m, n = topology.m, topology.n
+        self.m = m
+        self.n = n
+        self.topology = topology
+        self.routing_table = get_routing_table(m, n)
+        self.number_of_routers = m * n
+        self.buffer_size = buffer_size
+        self.receiver_list = receiver_list
+
+        router_ids = np.arange(self.number_of_routers)
+        self.router_ids = router_ids
+
+        # neighbour id in the respective port directions, -1 if not connected
+        self.neighbours_id = topology.neighbours_id
+        # input port seen by the receiver
+        self.reverse_port = topology.reverse_port
+
+        # round robin table, next connected port after the current one
+        connected = self.neighbours_id >= 0
+        self.next_port = np.zeros((self.number_of_routers, 5), dtype=int)
+        for port in range(5):
+            next_port = np.zeros(self.number_of_routers, dtype=int)
+            for candidate in range(4, port, -1):
+                next_port = np.where(connected[:, candidate], candidate, next_port)
+            self.next_port[:, port] = next_port
+
+        self.reset()
+        self.routers = [
+            VectorRouterView(self, router_id) for router_id in range(self.number_of_routers)
+        ]
+
+    def reset(self):
+        """ states as before the first cycle, the heatmaps given out are kept """
+        buffer_size = self.buffer_size
+        # router states, 1 row per router like the attributes of BaseRouter
+        self.current_serving_port = np.zeros(self.number_of_routers, dtype=int)
+        self.pkt_available_to_send_now = np.zeros((self.number_of_routers, 5), bool)
+        # FIFO per port, ring buffers of packet index for the ports 1 to 4.
+        # Port 0 is unlimited, its queues are linked lists in a pool shared by
+        # the routers, from local_head to local_tail through local_next
+        self.buffer = np.full((self.number_of_routers, 5, buffer_size), -1)
+        self.buffer_head = np.zeros((self.number_of_routers, 5), dtype=int)
+        self.buffer_count = np.zeros((self.number_of_routers, 5), dtype=int)
+        self.local_head = np.full(self.number_of_routers, -1)
+        self.local_tail = np.full(self.number_of_routers, -1)
+
+        # packets in the network, indexed by the packet index in the buffers
+        self.packets = []
+        self.free_pkt_index = []  # of the delivered packets, used again
+        self.pkt_in_flight = 0
+        self.packet_source = np.zeros(1024, dtype=int)
+        self.packet_dest = np.zeros(1024, dtype=int)
+        self.local_next = np.full(1024, -1)  # next in the local queue, -1 last
+        # packets entered from the neighbours, by router id
+        self.traversal_count = np.zeros(self.number_of_routers, dtype=np.int64)
+
+    ### buffer operations ###
+
+    def packet_in(self, router_id, packet):
+        """ store to the unlimited local port buffer """
+        packet.update_packet(router_id, self.routers[router_id].coordinates)
+        if self.free_pkt_index:
+            pkt_index = self.free_pkt_index.pop()
+            self.packets[pkt_index] = packet
+        else:
+            pkt_index = len(self.packets)
+            self.packets.append(packet)
+            if pkt_index == len(self.packet_dest):
+                self.grow_packet_arrays(pkt_index + 1)
+        self.pkt_in_flight += 1
+        self.packet_source[pkt_index] = router_id
+        self.packet_dest[pkt_index] = packet.dest_id
+
+        self.local_next[pkt_index] = -1
+        if self.buffer_count[router_id, 0] == 0:
+            self.local_head[router_id] = pkt_index
+        else:
+            self.local_next[self.local_tail[router_id]] = pkt_index
+        self.local_tail[router_id] = pkt_index
+        self.buffer_count[router_id, 0] += 1
+        return True
+
+    def packet_in_all(self, router_id, pkt_list):
+        """
+        for packet generator to store all the input packets, in 1 go with
+        numpy when there are a few
+        """
+        count = len(pkt_list)
+        if count < 2:
+            for pk in pkt_list:
+                self.packet_in(router_id, pk)
+            return
+        if pkt_list[0].store.record_traces:  # nothing kept otherwise
+            coordinates = self.routers[router_id].coordinates
+            for pk in pkt_list:
+                pk.update_packet(router_id, coordinates)
+
+        # packet index of the delivered packets first, then new ones
+        free_pkt_index = self.free_pkt_index
+        reused = min(count, len(free_pkt_index))
+        pkt_index = free_pkt_index[len(free_pkt_index) - reused :]
+        del free_pkt_index[len(free_pkt_index) - reused :]
+        packets = self.packets
+        for index, pk in zip(pkt_index, pkt_list):
+            packets[index] = pk
+        first_new = len(packets)
+        packets.extend(pkt_list[reused:])
+        pkt_index.extend(range(first_new, len(packets)))
+        if len(packets) > len(self.packet_dest):
+            self.grow_packet_arrays(len(packets))
+        self.pkt_in_flight += count
+        self.packet_source[pkt_index] = router_id
+        self.packet_dest[pkt_index] = [pk.dest_id for pk in pkt_list]
+
+        # linked in order, after the packets already queued
+        self.local_next[pkt_index[:-1]] = pkt_index[1:]
+        self.local_next[pkt_index[-1]] = -1
+        if self.buffer_count[router_id, 0] == 0:
+            self.local_head[router_id] = pkt_index[0]
+        else:
+            self.local_next[self.local_tail[router_id]] = pkt_index[0]
+        self.local_tail[router_id] = pkt_index[-1]
+        self.buffer_count[router_id, 0] += count
+
+    def grow_packet_arrays(self, size):
+        """ the arrays by packet index, at least doubled """
+        size = max(size, 2 * len(self.packet_dest))
+        self.packet_source = np.resize(self.packet_source, size)
+        self.packet_dest = np.resize(self.packet_dest, size)
+        self.local_next = np.resize(self.local_next, size)
+
+    def buffer_packet_peek(self, routers, ports):
+        """ retrive the first packet index of the port buffers """
+        local = ports == 0
+        pkt_index = np.empty(len(routers), dtype=int)
+        pkt_index[local] = self.local_head[routers[local]]
+        routers, ports = routers[~local], ports[~local]
+        pkt_index[~local] = self.buffer[routers, ports, self.buffer_head[routers, ports]]
+        return pkt_index
+
+    def buffer_packet_remove(self, routers, ports):
+        """ remove the first packet of the port buffers """
+        self.buffer_count[routers, ports] -= 1
+        local = ports == 0
+        local_routers = routers[local]
+        self.local_head[local_routers] = self.local_next[self.local_head[local_routers]]
+        routers, ports = routers[~local], ports[~local]
+        self.buffer_head[routers, ports] = (
+            self.buffer_head[routers, ports] + 1
+        ) % self.buffer_size
+
+    def buffer_packet_append(self, routers, ports, pkt_index):
+        """ store the packets to the back of the (non local) port buffers """
+        tails = (
+            self.buffer_head[routers, ports] + self.buffer_count[routers, ports]
+        ) % self.buffer_size
+        self.buffer[routers, ports, tails] = pkt_index
+        self.buffer_count[routers, ports] += 1
+        np.add.at(self.traversal_count, routers, 1)  # a router can get a few
+
+    def packet_store(self, router_id, pkt_index, current_clock_cycle):
+        """ store to local storage, fill in the XY path the packet went through """
+        packet = self.packets[pkt_index]
+        self.packets[pkt_index] = None  # packet left the network
+        self.free_pkt_index.append(pkt_index)
+        self.pkt_in_flight -= 1
+        if packet.store.record_traces:  # nothing kept otherwise
+            for router in self.xy_path(self.packet_source[pkt_index], router_id):
+                packet.update_packet(router, self.routers[router].coordinates)
+        packet.update_clock_cycle(current_clock_cycle)
+        self.receiver_list[router_id].store(packet)
+
+    ### router functions ###
+
+    def run_cycle(self, current_clock_cycle):
+        """ run the whole mesh for 1 cycle to send out pkt """
+        self.send_controller(current_clock_cycle)
+        self.prepare_next_cycle()
+
+    def send_controller(self, current_clock_cycle):
+        """
+        Run send_controller of all the routers for 1 cycle.
+        The routers in the object model are served in the order of their id, a
+        router can only see the changes made by the routers before it. As the
+        hardware like buffer_full hides the packets sent out in this cycle, the
+        only change seen is a local delivery emptying a full buffer.
+        """
+        routers = self.router_ids
+        ports = self.next_port[routers, self.current_serving_port]
+        self.current_serving_port = ports
+
+        serving = np.flatnonzero(self.pkt_available_to_send_now[routers, ports])
+        if serving.size == 0:
+            return
+        ports = ports[serving]
+        pkt_index = self.buffer_packet_peek(serving, ports)
+        direction = self.arbiter(serving, self.packet_dest[pkt_index])
+
+        # packets that have arrived
+        arrived = direction == self.SELF
+        arrived_routers = serving[arrived]
+        arrived_ports = ports[arrived]
+
+        # try sending the rest to the neighbours
+        sending = ~arrived
+        sender = serving[sending]
+        sender_ports = ports[sending]
+        sender_pkt = pkt_index[sending]
+        receiver = self.neighbours_id[sender, direction[sending]]
+        receiver_ports = self.reverse_port[sender, direction[sending]]
+        full = self.buffer_count[receiver, receiver_ports] >= self.buffer_size
+        delivered_port = np.full(self.number_of_routers, -1)
+        delivered_port[arrived_routers] = arrived_ports
+        freed = (delivered_port[receiver] == receiver_ports) & (receiver < sender)
+        accepted = ~full | freed
+
+        self.buffer_packet_remove(arrived_routers, arrived_ports)
+        self.buffer_packet_remove(sender[accepted], sender_ports[accepted])
+        self.buffer_packet_append(
+            receiver[accepted], receiver_ports[accepted], sender_pkt[accepted]
+        )
+
+        for router_id, pkt in zip(arrived_routers.tolist(), pkt_index[arrived].tolist()):
+            self.packet_store(router_id, pkt, current_clock_cycle)
+
+    def prepare_next_cycle(self):
+        """ mark data available to send for next cycle """
+        self.pkt_available_to_send_now = self.buffer_count > 0
+
+    def arbiter(self, routers, dest):
+        """
+        Func: To determine which direction to send the packets
+        Algo: X-Y algorithm, from the routing table
+        """
+        return self.routing_table.directions(routers, dest)
+
+    def xy_path(self, source_id, dest_id):
+        """ routers visited after the source router, following X-Y algorithm """
+        source_row, source_col = divmod(int(source_id), self.n)
+        dest_row, dest_col = divmod(int(dest_id), self.n)
+        path = []
+        if dest_col != source_col:
+            step = 1 if dest_col > source_col else -1
+            for col in range(source_col + step, dest_col + step, step):
+                path.append(source_row * self.n + col)
+        if dest_row != source_row:
+            step = 1 if dest_row > source_row else -1
+            for row in range(source_row + step, dest_row + step, step):
+                path.append(row * self.n + dest_col)
+        return path
+
+    ### external functions for simulator performance ###
+
+    def heatmap(self, m, n):
+        """ traversal count as a m x n view, can be called at any time """
+        return self.traversal_count.reshape(m, n)
+
+    def empty_buffers(self):
+        """
+        For: early program termination
+        Func: check if all buffer empty.  Return False for any filled buffer
+        """
+        return not self.buffer_count.any()
+
+
+class VectorRouterView:
+    """ router like access to 1 router of the engine, for the packet injection """
+
+    def __init__(self, engine, id):
+        self.engine = engine
+        self.id = id
+        self.coordinates = (id // engine.n, id % engine.n)
+
+    def packet_in(self, packet, port):
+        if port != 0:
+            raise ValueError("Packets can only be injected to the local port")
+        return self.engine.packet_in(self.id, packet)
+
+    def packet_in_all(self, pkt_list):
+        self.engine.packet_in_all(self.id, pkt_list)
+
+    def buffer_empty_actual(self, port):
+        return self.engine.buffer_count[self.id, port] == 0
+
+    def empty_buffers(self):
+        return not self.engine.buffer_count[self.id].any()